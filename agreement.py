@@ -0,0 +1,68 @@
+import re
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from templates import DEFAULT_TEMPLATE_ID, TEMPLATES
+
+DEFAULT_AGENCY_REP = "The ATM Agency Representative"
+
+AGREEMENT_FIELDS = (
+    "client_name", "client_rep_name", "client_email",
+    "agency_rep_name", "agency_email", "effective_date", "state_law",
+    "template_id",
+)
+
+
+def is_valid_email(email: str) -> bool:
+    if not email:
+        return False
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+
+def normalized_details(details):
+    """Strip text fields and lower-case emails, as rendered and as hashed."""
+    normalized = {}
+    for field in AGREEMENT_FIELDS:
+        value = details.get(field, "")
+        if isinstance(value, str):
+            value = value.strip()
+            if field.endswith("_email"):
+                value = value.lower()
+        normalized[field] = value
+    normalized["template_id"] = normalized["template_id"] or DEFAULT_TEMPLATE_ID
+    return normalized
+
+
+def validate_details(details):
+    """Return the form's error messages for ``details`` (empty when valid)."""
+    errors = []
+    if not details["client_name"].strip():
+        errors.append("Please enter the Client / Company name.")
+    if not details["client_rep_name"].strip():
+        errors.append("Please enter the Client representative name.")
+    if not is_valid_email(details["client_email"]):
+        errors.append("Please enter a valid client email.")
+    if not details["state_law"].strip():
+        errors.append("Please enter the governing state for law.")
+    if details.get("template_id", DEFAULT_TEMPLATE_ID) not in TEMPLATES:
+        errors.append("Please choose one of the available agreement templates.")
+    return errors
+
+
+def placeholder_values(details):
+    """Placeholder text for the clause markup; free text is escaped so it never reads as tags."""
+    return {
+        "[Client Name]": escape(details["client_name"]),
+        "[Effective Date]": details["effective_date"].strftime("%B %d, %Y"),
+        "[State]": escape(details["state_law"]),
+        "[Agency Rep Name]": escape(details["agency_rep_name"]),
+    }
+
+
+def agreement_filename(details, on=None):
+    on = on or datetime.now()
+    # client names are free text; keep them from adding directories or ".." to the name
+    client = re.sub(r'[ /\\\x00-\x1f\x7f]', '_', details['client_name'])
+    client = re.sub(r'\.{2,}', '.', client)
+    return f"Ad_Agreement_{client}_{on.strftime('%Y%m%d')}.pdf"
@@ -0,0 +1,190 @@
+import copy
+import io
+from datetime import date
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+from reportlab.lib.units import inch
+from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT
+
+from agreement import placeholder_values
+from compact_pdf import linearize
+from templates import CompiledText, get_template
+
+
+# -----------------------------
+# Cached layout
+# -----------------------------
+class PrewrappedParagraph(Paragraph):
+    """Paragraph that remembers its line breaks for each available width.
+
+    ``wrap_cache`` may be shared between paragraphs with the same text and style.
+    """
+
+    def __init__(self, *args, wrap_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wrap_cache = {} if wrap_cache is None else wrap_cache
+
+    def wrap(self, availWidth, availHeight):
+        cached = self._wrap_cache.get(availWidth)
+        if cached is None:
+            super().wrap(availWidth, availHeight)
+            # breaking lines also processes self.frags in place, which split() relies on
+            self._wrap_cache[availWidth] = (self.frags, self._wrapWidths, self.blPara, self.height)
+        else:
+            self.width = availWidth
+            self.frags, self._wrapWidths, self.blPara, self.height = cached
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        # splitting rewrites the line fragments in place; keep the cached ones intact
+        if hasattr(self, 'blPara'):
+            self.blPara = copy.deepcopy(self.blPara)
+        return super().split(availWidth, availHeight)
+
+
+class SharedParagraph:
+    """Line breaks of a paragraph that recurs in every build.
+
+    Only that data is shared: ``paragraph()`` makes a new flowable per build,
+    so the state platypus keeps on a flowable while laying out a document
+    never carries over into another build.
+    """
+
+    def __init__(self, text, style):
+        self.text = text
+        self.style = style
+        self.wrap_cache = {}
+
+    def paragraph(self):
+        return PrewrappedParagraph(self.text, self.style, wrap_cache=self.wrap_cache)
+
+
+class AgreementLayout:
+    """Styles and clause flowables shared by every agreement from one template.
+
+    Clauses without placeholders are wrapped once; clauses that
+    contain a placeholder are compiled once and re-flowed per contract.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.styles = getSampleStyleSheet()
+        self.styles.add(ParagraphStyle(name='Justify', alignment=TA_JUSTIFY, fontSize=11, leading=14))
+        self.styles.add(ParagraphStyle(name='CustomTitle', fontSize=14, alignment=TA_LEFT, spaceAfter=12, textColor='#0f172a'))
+
+
+        self.title = SharedParagraph(template.title, self.styles['CustomTitle'])
+        self.clauses = []
+        for block in template.text.strip().split('\n\n'):
+            compiled = CompiledText(block.strip().replace('\n', '<br/>'))
+            if compiled.has_placeholders:
+                self.clauses.append(compiled)
+            else:
+                self.clauses.append(SharedParagraph(compiled.render({}), self.styles['Justify']))
+
+    def body_flowables(self, values):
+        """Return a fresh flowable list for the agreement body.
+
+        ``values`` maps placeholder (e.g. ``"[Client Name]"``) to its text.
+        """
+        elements = [self.title.paragraph(), Spacer(1, 0.1*inch)]
+        for clause in self.clauses:
+            if isinstance(clause, CompiledText):
+                elements.append(Paragraph(clause.render(values), self.styles['Justify']))
+            else:
+                elements.append(clause.paragraph())
+            elements.append(Spacer(1, 0.12*inch))
+        return elements
+
+    def draw_footer(self, canvas, doc):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 7)
+        canvas.setFillColor('#64748b')
+        canvas.drawString(doc.leftMargin, 0.5*inch, f"Template {self.template.version_id}")
+        canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 0.5*inch, f"Page {doc.page}")
+        canvas.restoreState()
+
+
+@lru_cache(maxsize=None)
+def get_agreement_layout(template_id=None):
+    return AgreementLayout(get_template(template_id))
+
+
+# -----------------------------
+# PDF build (fully in memory)
+# -----------------------------
+def build_agreement_pdf(details, client_signature, agency_signature, signature_mode="vector", signed_on=None,
+                        compact=False):
+    """Render the signed agreement and return the PDF bytes.
+
+    ``details`` holds the ``AGREEMENT_FIELDS`` values; the signatures are
+    ``Signature`` objects, drawn as vector paths or as a cropped 1-bit raster
+    depending on ``signature_mode``. ``signed_on`` defaults to today.
+
+    ``compact`` trims the signatures (see ``Signature.flowable``), writes
+    streams as raw Flate instead of ASCII85-wrapped Flate, and linearizes the
+    file when pikepdf is installed. Page streams are always compressed, and
+    ReportLab stores identical images once.
+
+    The output is deterministic: identical arguments give identical bytes.
+    """
+    layout = get_agreement_layout(details.get('template_id'))
+    styles = layout.styles
+    signed_on = (signed_on or date.today()).strftime('%B %d, %Y')
+
+    # styles and static clauses are shared across calls;
+    # only the clauses with placeholders are re-flowed here
+    elements = layout.body_flowables(placeholder_values(details))
+
+    elements.append(PageBreak())
+    elements.append(Paragraph("<b>SIGNATURES</b>", styles['CustomTitle']))
+    elements.append(Spacer(1, 0.2*inch))
+
+    elements.append(Paragraph("<b>Client Representative</b>", styles['Normal']))
+    elements.append(Spacer(1, 0.08*inch))
+    elements.append(client_signature.flowable(signature_mode, compact))
+    elements.append(Paragraph(f"<b>Name:</b> {escape(details['client_rep_name'])}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Company:</b> {escape(details['client_name'])}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Email:</b> {escape(details['client_email'])}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Date:</b> {signed_on}", styles['Normal']))
+
+    elements.append(Spacer(1, 0.4*inch))
+
+    elements.append(Paragraph("<b>The ATM Agency</b>", styles['Normal']))
+    elements.append(Spacer(1, 0.08*inch))
+    elements.append(agency_signature.flowable(signature_mode, compact))
+    elements.append(Paragraph(f"<b>Name:</b> {escape(details['agency_rep_name'])}", styles['Normal']))
+    if details['agency_email']:
+        elements.append(Paragraph(f"<b>Email:</b> {escape(details['agency_email'])}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Date:</b> {signed_on}", styles['Normal']))
+
+    buf = io.BytesIO()
+    # invariant mode pins the creation date and document ID, so the bytes
+    # depend only on the content
+    doc = SimpleDocTemplate(buf, pagesize=LETTER,
+                            rightMargin=72, leftMargin=72,
+                            topMargin=72, bottomMargin=72,
+                            invariant=1, pageCompression=1,
+                            title=layout.template.title,
+                            author="The ATM Agency",
+                            subject=f"{layout.template.version_id}: {details['client_name']}",
+                            keywords=layout.template.version_id,
+                            creator="The ATM Agency Agreement System")
+    if not compact:
+        doc.build(elements, onFirstPage=layout.draw_footer, onLaterPages=layout.draw_footer)
+        return buf.getvalue()
+
+    # ASCII85 is a process-wide ReportLab setting; builds run one at a time
+    # per render worker, so switching it around this build is safe
+    use_a85 = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        doc.build(elements, onFirstPage=layout.draw_footer, onLaterPages=layout.draw_footer)
+    finally:
+        rl_config.useA85 = use_a85
+    return linearize(buf.getvalue())
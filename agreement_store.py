@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agreements (
+    key TEXT PRIMARY KEY,
+    client_name TEXT NOT NULL,
+    client_email TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    emailed_at TEXT,
+    emailed_to TEXT,
+    effective_date TEXT
+);
+CREATE INDEX IF NOT EXISTS agreements_client ON agreements (client_name, client_email);
+CREATE INDEX IF NOT EXISTS agreements_email ON agreements (client_email);
+"""
+
+# columns added after the first release; stores created before get them on open
+_ADDED_COLUMNS = (
+    ("emailed_to", "TEXT"),
+    ("effective_date", "TEXT"),
+)
+
+
+def agreement_key(details, client_signature, agency_signature, signature_mode, signed_on, template_version,
+                  compact=False):
+    """Content address of a signed agreement.
+
+    ``details`` must already be normalized; the key covers everything that
+    ends up in the PDF, so equal keys mean byte-identical output.
+    """
+    payload = {
+        "details": {field: str(value) for field, value in sorted(details.items())},
+        "signatures": [client_signature.fingerprint(signature_mode), agency_signature.fingerprint(signature_mode)],
+        "signed_on": signed_on.isoformat(),
+        "template_version": template_version,
+    }
+    if compact:
+        # only added when set, so keys of standard PDFs stay as they were
+        payload["compact"] = True
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class AgreementStore:
+    """Signed agreements on local disk: SQLite metadata plus one blob file per key."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "agreements.sqlite3"
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(agreements)")}
+            for name, declaration in _ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE agreements ADD COLUMN {name} {declaration}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def blob_path(self, key):
+        return self.blob_dir / key[:2] / f"{key}.pdf"
+
+    def get(self, key):
+        """Metadata row for ``key``, or None."""
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM agreements WHERE key = ?", (key,)).fetchone()
+
+    def read(self, key):
+        return self.blob_path(key).read_bytes()
+
+    def put(self, key, pdf_data, details, filename, template_version):
+        path = self.blob_path(key)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # a unique temp file per writer: threads of one process may store the same key at once
+            with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".part", delete=False) as tmp:
+                tmp.write(pdf_data)
+            try:
+                os.replace(tmp.name, path)
+            except OSError:
+                # same key means same bytes, so a blob another writer put there is just as good
+                if not path.exists():
+                    raise
+            finally:
+                if os.path.exists(tmp.name):
+                    os.remove(tmp.name)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO agreements (key, client_name, client_email, filename, template_version, size,"
+                " created_at, effective_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, details["client_name"], details["client_email"], filename, template_version,
+                 len(pdf_data), datetime.now().isoformat(timespec="seconds"), details["effective_date"].isoformat()),
+            )
+
+    def claim_email(self, key):
+        """Mark ``key`` as emailed; True only for the first caller."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE agreements SET emailed_at = ? WHERE key = ? AND emailed_at IS NULL",
+                (datetime.now().isoformat(timespec="seconds"), key),
+            )
+            return cur.rowcount == 1
+
+    def release_email(self, key):
+        with self._connect() as conn:
+            conn.execute("UPDATE agreements SET emailed_at = NULL WHERE key = ?", (key,))
+
+    def emailed_recipients(self, key):
+        """Addresses that already got ``key`` or refused it for good; they are not emailed again."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT emailed_to FROM agreements WHERE key = ?", (key,)).fetchone()
+        return set(json.loads(row["emailed_to"])) if row and row["emailed_to"] else set()
+
+    def finish_email(self, key, settled, complete):
+        """Record the addresses a mail job settled; unless ``complete``, release the claim for a retry."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT emailed_to FROM agreements WHERE key = ?", (key,)).fetchone()
+            emailed_to = set(json.loads(row["emailed_to"])) if row and row["emailed_to"] else set()
+            emailed_to.update(email.lower() for email in settled)
+            conn.execute(
+                "UPDATE agreements SET emailed_to = ?, emailed_at = CASE WHEN ? THEN emailed_at END WHERE key = ?",
+                (json.dumps(sorted(emailed_to)), complete, key),
+            )
+
+    def agreements_for_client(self, client_name):
+        """Every agreement signed for exactly ``client_name``, by ``effective_from`` (YYYY-MM-DD).
+
+        ``effective_from`` is the agreement's effective date; rows stored before
+        that was recorded fall back to their signing date.
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT *, COALESCE(effective_date, substr(created_at, 1, 10)) AS effective_from FROM agreements"
+                " WHERE client_name = ? ORDER BY effective_from, created_at",
+                (client_name.strip(),),
+            ).fetchall()
+
+    def find_by_email(self, client_email, limit=50):
+        """Agreements signed with exactly this client email, newest first."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT * FROM agreements WHERE client_email = ? ORDER BY created_at DESC LIMIT ?",
+                (client_email.strip().lower(), limit),
+            ).fetchall()
@@ -0,0 +1,350 @@
+"""Headless HTTP API for generating signed agreements.
+
+``POST /agreements`` takes the form's fields and both signatures, checks them
+with the form's rules, renders the PDF on the render pool (or reuses the
+stored copy of an identical agreement), queues the emails and streams the
+PDF back:
+
+    python api.py --port 8600
+    curl -H "Authorization: Bearer $API_TOKEN" -H "Content-Type: application/json" \
+         -d @agreement.json -o signed.pdf localhost:8600/agreements
+
+A JSON body holds the form's fields:
+
+    client_name, client_rep_name, client_email, state_law   required
+    agency_rep_name, agency_email                           optional
+    effective_date                                          YYYY-MM-DD, today when omitted
+    template_id                                             a registered template, the standard one when omitted
+
+plus ``client_signature`` and ``agency_signature``, each either
+``{"strokes": [[["M", x, y], ["L", x, y], ...], ...]}`` (pad coordinates,
+optionally with ``width``/``height``; Q and C commands and st_canvas path
+objects are accepted too) or ``{"png": "<base64>"}``. A multipart body
+holds the same fields as form fields, with signatures as PNG uploads or
+stroke JSON. Invalid requests get 422 and ``{"errors": [...]}`` with the
+form's messages. The response carries ``X-Agreement-Key`` and, when
+emails were queued, ``X-Mail-Job`` for ``GET /mail-jobs/{id}``; stored PDFs
+are served again by ``GET /agreements/{key}``.
+
+Every route except ``/metrics`` needs ``Authorization: Bearer <api_token>``
+with the ``api_token`` from the secrets file; without one the API does not
+start, since it sends mail through the agency's SMTP account.
+
+Settings come from the app's secrets file, so the API and the Streamlit UI
+share the agreement store and the SMTP account. Built on Starlette and
+uvicorn, which Streamlit already depends on.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import functools
+import hmac
+import io
+import json
+import logging
+import queue
+import re
+import time
+import tomllib
+from contextlib import asynccontextmanager
+from datetime import date
+from pathlib import Path
+
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+import metrics
+from agreement import AGREEMENT_FIELDS, DEFAULT_AGENCY_REP, agreement_filename, normalized_details, validate_details
+from agreement_store import AgreementStore, agreement_key
+from config import parse_config
+from mailer import MailQueue, agreement_recipients
+from render_pool import RenderPool
+from signatures import Signature
+from strokes import MAX_STROKES, PAD_HEIGHT, PAD_WIDTH, clean_path, stroke_object
+from templates import DEFAULT_TEMPLATE_ID, get_template
+
+logger = logging.getLogger("agreement.api")
+
+MAX_BODY_BYTES = 8_000_000
+MAX_PNG_BYTES = 2_000_000
+MAX_PNG_PIXELS = 4_000_000
+MAX_PAD_SIZE = 4000
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+# -----------------------------
+# Request decoding
+# -----------------------------
+def signature_from_strokes(strokes, width=PAD_WIDTH, height=PAD_HEIGHT):
+    if not all(isinstance(v, int) and not isinstance(v, bool) and 0 < v <= MAX_PAD_SIZE for v in (width, height)):
+        raise ValueError(f"Signature width and height must be whole numbers up to {MAX_PAD_SIZE}.")
+    if not isinstance(strokes, list):
+        raise ValueError("Signature strokes must be a list.")
+    if len(strokes) > MAX_STROKES:
+        raise ValueError(f"A signature may have at most {MAX_STROKES} strokes.")
+    objects = []
+    for stroke in strokes:
+        # bare command lists, or path objects as st_canvas reports them
+        path = stroke.get("path") if isinstance(stroke, dict) else stroke
+        path = clean_path(path, width, height) if isinstance(path, list) else None
+        if path is None:
+            raise ValueError('Each signature stroke must be a list of path commands (["M", x, y], ["L", x, y], ...)'
+                             ' starting with "M".')
+        objects.append(stroke_object(path))
+    return Signature.from_strokes(objects, width, height)
+
+
+def signature_from_png(data):
+    if len(data) > MAX_PNG_BYTES:
+        raise ValueError(f"Signature images may be at most {MAX_PNG_BYTES} bytes.")
+    try:
+        # check the header before decoding, so a small file can't expand into a huge array
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format != "PNG":
+                raise ValueError("Signature images must be PNG.")
+            if img.width * img.height > MAX_PNG_PIXELS:
+                raise ValueError(f"Signature images may have at most {MAX_PNG_PIXELS} pixels.")
+        return Signature.from_image_file(io.BytesIO(data))
+    except OSError:
+        raise ValueError("Signature images must be PNG.") from None
+
+
+async def read_signature(value):
+    """Decode a ``client_signature`` / ``agency_signature`` field; raises ValueError."""
+    if value is None or value == "":
+        return Signature()
+    if isinstance(value, UploadFile):
+        data = await value.read(MAX_PNG_BYTES + 1)
+        return await asyncio.to_thread(signature_from_png, data)
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError("Signature fields must be stroke JSON or a PNG upload.") from None
+    if isinstance(value, list):
+        value = {"strokes": value}
+    if not isinstance(value, dict):
+        raise ValueError('Signatures must be {"strokes": [...]} or {"png": "<base64>"}.')
+    if "png" in value:
+        try:
+            data = base64.b64decode(value["png"], validate=True)
+        except (binascii.Error, TypeError):
+            raise ValueError("Signature PNG must be base64-encoded.") from None
+        return await asyncio.to_thread(signature_from_png, data)
+    return signature_from_strokes(value.get("strokes"), value.get("width", PAD_WIDTH), value.get("height", PAD_HEIGHT))
+
+
+def request_details(fields):
+    """The form's fields from a request body, with the form's defaults; raises ValueError."""
+    details = {field: fields.get(field) or "" for field in AGREEMENT_FIELDS}
+    if not all(isinstance(value, str) for value in details.values()):
+        raise ValueError("Agreement fields must be strings.")
+    details["agency_rep_name"] = details["agency_rep_name"] or DEFAULT_AGENCY_REP
+    details["template_id"] = details["template_id"] or DEFAULT_TEMPLATE_ID
+    try:
+        effective_date = details["effective_date"].strip()
+        details["effective_date"] = date.fromisoformat(effective_date) if effective_date else date.today()
+    except ValueError:
+        raise ValueError("Please enter the effective date as YYYY-MM-DD.") from None
+    return details
+
+
+async def read_fields(request):
+    """Request body as a mapping of field name to value; raises ValueError."""
+    if int(request.headers.get("content-length") or 0) > MAX_BODY_BYTES:
+        raise ValueError(f"Request body may be at most {MAX_BODY_BYTES} bytes.")
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        form = await request.form(max_files=2, max_fields=len(AGREEMENT_FIELDS) + 2)
+        return dict(form)
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError(f"Request body may be at most {MAX_BODY_BYTES} bytes.")
+    try:
+        fields = json.loads(body)
+    except ValueError:
+        raise ValueError("Request body must be JSON or multipart form data.") from None
+    if not isinstance(fields, dict):
+        raise ValueError("Request body must be a JSON object.")
+    return fields
+
+
+def error_response(errors, status_code=422):
+    return JSONResponse({"errors": errors}, status_code=status_code)
+
+
+def requires_token(endpoint):
+    @functools.wraps(endpoint)
+    async def guarded(request):
+        expected = f"Bearer {request.app.state.config.api_token}"
+        if not hmac.compare_digest(request.headers.get("authorization", "").encode(), expected.encode()):
+            response = error_response(["Missing or wrong API token."], 401)
+            response.headers["WWW-Authenticate"] = "Bearer"
+            return response
+        return await endpoint(request)
+    return guarded
+
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+async def create_agreement(request):
+    state = request.app.state
+    config = state.config
+    try:
+        fields = await read_fields(request)
+    except ValueError as e:
+        return error_response([str(e)], 400)
+    try:
+        raw_details = request_details(fields)
+    except ValueError as e:
+        return error_response([str(e)])
+
+    errors = validate_details(raw_details)
+    signatures = []
+    started = time.perf_counter()
+    for name in ("client_signature", "agency_signature"):
+        try:
+            signatures.append(await read_signature(fields.get(name)))
+        except ValueError as e:
+            errors.append(str(e))
+            signatures.append(Signature())
+    metrics.observe(metrics.STAGE_SECONDS, "signature_decode", time.perf_counter() - started)
+    client_signature, agency_signature = signatures
+    if not errors and (client_signature.is_empty() or agency_signature.is_empty()):
+        errors.append("Both signatures are required to generate the signed PDF.")
+    if errors:
+        return error_response(errors)
+    for signature in signatures:
+        metrics.observe(metrics.PAYLOAD_BYTES, "signature", signature.payload_size())
+
+    details = normalized_details(raw_details)
+    signed_on = date.today()
+    template = get_template(details["template_id"])
+    filename = agreement_filename(details, signed_on)
+    store = state.store
+    key = agreement_key(details, client_signature, agency_signature, config.signature_mode, signed_on,
+                        template.version_id, config.compact_pdf)
+
+    pdf_data = None
+    if await asyncio.to_thread(store.get, key) is None:
+        try:
+            # rendering runs on the worker processes; awaiting it leaves the loop free
+            pdf_data = await asyncio.wrap_future(state.render_pool.submit(
+                details, client_signature, agency_signature, config.signature_mode, signed_on, config.compact_pdf))
+        except Exception as e:
+            logger.exception("Rendering agreement %s failed", key)
+            return error_response([f"An error occurred while generating the PDF: {e}"], 500)
+        await asyncio.to_thread(store.put, key, pdf_data, details, filename, template.version_id)
+
+    headers = {"X-Agreement-Key": key}
+    # emails go out on the background mail queue, once per stored agreement
+    if state.mail_queue is not None and await asyncio.to_thread(store.claim_email, key):
+        if pdf_data is None:
+            pdf_data = await asyncio.to_thread(store.read, key)
+        def record_delivery(mail_job):
+            # runs on the mail worker thread; settled addresses are never emailed
+            # again, and anyone left to retry releases the claim for the next request
+            store.finish_email(key, mail_job.settled(), complete=not mail_job.retryable())
+        settled = await asyncio.to_thread(store.emailed_recipients, key)
+        recipients = agreement_recipients(details, config.smtp.admin_email, settled)
+        try:
+            if recipients:
+                job = state.mail_queue.submit(recipients, pdf_data, filename, record_delivery)
+                headers["X-Mail-Job"] = str(job.id)
+        except queue.Full:
+            await asyncio.to_thread(store.release_email, key)
+            headers["X-Mail-Status"] = "queue-full"
+    # streamed from the stored blob in chunks, whether it was just built or not
+    return FileResponse(store.blob_path(key), headers=headers, media_type="application/pdf", filename=filename)
+
+
+async def get_agreement(request):
+    key = request.path_params["key"]
+    row = await asyncio.to_thread(request.app.state.store.get, key) if _KEY_RE.match(key) else None
+    if row is None:
+        return error_response(["No stored agreement has this key."], 404)
+    return FileResponse(request.app.state.store.blob_path(key), media_type="application/pdf",
+                        filename=row["filename"])
+
+
+async def get_mail_job(request):
+    mail_queue = request.app.state.mail_queue
+    job = mail_queue.get(request.path_params["job_id"]) if mail_queue is not None else None
+    if job is None:
+        return error_response(["No mail job has this id."], 404)
+    return JSONResponse({"id": job.id, "status": job.status, "attempts": job.attempts, "results": job.results})
+
+
+async def get_metrics(request):
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+# -----------------------------
+# App
+# -----------------------------
+def load_secrets(path):
+    """The Streamlit secrets file as a dict; empty when there is none."""
+    try:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def create_app(config):
+    if not config.api_token:
+        raise ValueError("api_token is not set in secrets; the API will not serve without one.")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        metrics.configure(config.metrics, config.metrics_json_logs)
+        app.state.config = config
+        app.state.store = AgreementStore(config.store_dir)
+        app.state.render_pool = RenderPool(max_workers=config.render_workers, size_budget=config.pdf_size_budget)
+        app.state.mail_queue = MailQueue(config.smtp) if config.smtp else None
+        if config.smtp is None:
+            logger.warning("Email credentials not found in secrets; agreements will not be emailed.")
+        try:
+            yield
+        finally:
+            app.state.render_pool.shutdown()
+            if app.state.mail_queue is not None:
+                app.state.mail_queue.close()
+
+    return Starlette(
+        routes=[
+            Route("/agreements", requires_token(create_agreement), methods=["POST"]),
+            Route("/agreements/{key}", requires_token(get_agreement)),
+            Route("/mail-jobs/{job_id:int}", requires_token(get_mail_job)),
+            Route("/metrics", get_metrics),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the agreement generator over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--secrets", default=str(Path(".streamlit", "secrets.toml")),
+                        help="secrets file with the app's settings (default: .streamlit/secrets.toml)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = parse_config(load_secrets(args.secrets))
+    if not config.api_token:
+        parser.error(f"set api_token in {args.secrets}; the API will not serve without one")
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
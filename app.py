@@ -1,22 +1,21 @@
+import time
+_run_started = time.perf_counter()
+
 import streamlit as st
-from streamlit_drawable_canvas import st_canvas
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image as RLImage
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT
-import tempfile
-import os
-from datetime import datetime
-from PIL import Image
-import io
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-import re
-import numpy as np
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from concurrent.futures import Future
+from datetime import date, datetime
+import hmac
+import queue
+
+# Only light modules are imported up front. ReportLab, PIL, numpy and the
+# smtplib/email stack load on first use (signature step, Generate, first email).
+from agreement import AGREEMENT_FIELDS, DEFAULT_AGENCY_REP, agreement_filename, normalized_details, validate_details
+from agreement_store import AgreementStore, agreement_key
+from artifacts import SessionArtifacts
+from config import parse_config
+from templates import DEFAULT_TEMPLATE_ID, TEMPLATES, get_template
+import metrics
 
 # -----------------------------
 # Page configuration & styling
@@ -52,18 +51,33 @@ st.markdown("""
 # -----------------------------
 # Email config from secrets
 # -----------------------------
-try:
-    EMAIL_ADDRESS = st.secrets["email"]["sender_email"]
-    EMAIL_PASSWORD = st.secrets["email"]["password"]
-    SMTP_SERVER = st.secrets["email"]["smtp_server"]
-    PORT = st.secrets["email"]["port"]
-    ADMIN_EMAIL = st.secrets["email"].get("admin_email", None)
-except Exception:
-    EMAIL_ADDRESS = None
-    EMAIL_PASSWORD = None
-    SMTP_SERVER = None
-    PORT = None
-    ADMIN_EMAIL = None
+@st.cache_resource
+def load_config():
+    # parsed once per server process; restart the app to pick up edited secrets
+    return parse_config(st.secrets)
+
+CONFIG = load_config()
+SMTP_SETTINGS = CONFIG.smtp
+SIGNATURE_MODE = CONFIG.signature_mode
+RENDER_WORKERS = CONFIG.render_workers
+STORE_DIR = CONFIG.store_dir
+COMPACT_PDF = CONFIG.compact_pdf
+PDF_SIZE_BUDGET = CONFIG.pdf_size_budget
+ARTIFACT_MEMORY_MB = CONFIG.artifact_memory_mb
+ARTIFACT_IDLE_SECONDS = CONFIG.artifact_idle_seconds
+CANVAS_TRANSPORT = CONFIG.canvas_transport
+ADMIN_PASSWORD = CONFIG.admin_password
+
+metrics.configure(CONFIG.metrics, CONFIG.metrics_json_logs)
+
+@st.cache_resource
+def start_metrics_server(port):
+    return metrics.serve(port)
+
+if CONFIG.metrics and CONFIG.metrics_port:
+    start_metrics_server(CONFIG.metrics_port)
+
+if SMTP_SETTINGS is None:
     st.warning("⚠️ Email credentials not found in secrets. Email sending will be disabled; PDF download will still work.")
 
 # -----------------------------
@@ -78,106 +92,15 @@ if 'client_rep_name' not in st.session_state:
 if 'client_email' not in st.session_state:
     st.session_state.client_email = ""
 if 'agency_rep_name' not in st.session_state:
-    st.session_state.agency_rep_name = "The ATM Agency Representative"
+    st.session_state.agency_rep_name = DEFAULT_AGENCY_REP
 if 'agency_email' not in st.session_state:
     st.session_state.agency_email = ""
 if 'state_law' not in st.session_state:
     st.session_state.state_law = ""
 if 'effective_date' not in st.session_state:
     st.session_state.effective_date = datetime.now().date()
-
-# -----------------------------
-# Agreement text (replace in PDF)
-# -----------------------------
-agreement_text = """
-AD MANAGER & PARTNERSHIP AGREEMENT
-
-This Ad Manager & Partnership Agreement (“Agreement”) is entered into between:
-
-The ATM Agency (“Agency”)  
-and  
-[Client Name] (“Client”)  
-Effective as of [Effective Date].
-
-1. SCOPE OF SERVICES
-The Agency will manage paid advertising campaigns, strategy, creative assets, and performance optimization for the Client’s digital products, online courses, and associated offers.
-
-Core responsibilities include:
-• Full ad account management (Facebook/Meta, Instagram, TikTok, Google, YouTube, or other platforms as needed)
-• Ad creation, creative direction, and copywriting
-• Campaign testing and optimization
-• Funnel monitoring and recommendations
-• Weekly and monthly performance reporting
-• Scaling campaigns based on performance metrics
-• Audience research and targeting
-• Offer positioning assistance
-• Budget allocation guidance
-
-2. COMMISSION & PAYMENT TERMS
-The Client agrees to pay The ATM Agency a commission of:
-
-10% of all sales generated from paid advertising campaigns managed by the Agency.
-
-Details:
-• Commission applies to digital products, online courses, downloads, coaching programs, and all digital-based revenue generated through Agency-managed campaigns.
-• Commission is calculated from gross revenue (before refunds, payment processor fees, or deductions).
-• Payments to the Agency are due within 7 days of each completed calendar month.
-• The Client must provide accurate sales data, dashboards, and reporting access.
-• If the Client uses a third-party payment processor, the Agency must be granted read-only access.
-
-3. AD SPEND & ACCOUNT ACCESS
-The Client agrees to:
-• Pay all advertising spend directly to the ad platform.
-• Provide necessary account access (Ad Manager, Pixel/Conversions API, Website, CRM, Funnels, etc.).
-• Maintain all accounts in good standing to prevent disruption.
-
-The Agency is not responsible for platform bans, disabled accounts, or restricted features.
-
-4. CONTENT & CREATIVE
-The Agency may create and test ad creatives, including images, videos, ad copy, headlines, and marketing scripts. The Client agrees to provide brand guidelines, product access, testimonials, and any requested materials.
-
-5. PERFORMANCE DISCLAIMER
-The Agency does not guarantee specific results, performance metrics, earnings, or sales outcomes. All advertising includes risk and is subject to platform algorithm changes.
-
-6. TERM & TERMINATION
-This Agreement renews month-to-month unless terminated with 14 days written notice by either party.
-
-Upon termination:
-• All commissions owed remain payable to the Agency.
-• The Agency will provide a transition period of up to 7 days.
-• The Client retains ownership of all ad accounts and assets the Client originally owned.
-• The Agency retains ownership of any proprietary frameworks or templates.
-
-7. CONFIDENTIALITY
-Both parties agree to strict confidentiality regarding customer data, funnels, sales systems, and marketing strategies. This clause survives termination.
-
-8. INTELLECTUAL PROPERTY
-The Client owns all content, funnels, products, and materials they provide. The Agency owns its internal processes, frameworks, and optimization systems. Creations specifically for the Client (ad copy, creatives, audiences, etc.) become Client-owned upon payment of all commissions.
-
-9. NON-DISPARAGEMENT
-Both parties agree not to make negative or harmful public statements about the other.
-
-10. LIMITATION OF LIABILITY
-The Agency shall not be liable for loss of revenue, ad account shutdowns, platform instability, third-party software issues, chargebacks, or customer disputes. Liability is limited to the amount paid by the Client in the last 30 days.
-
-11. GOVERNING LAW
-This Agreement is governed by the laws of the State of [State].
-
-12. ENTIRE AGREEMENT
-This Agreement constitutes the full understanding between the parties and supersedes all prior discussions.
-
-AGREED & ACCEPTED:
-
-______________________________
-Client
-Name: [Client Name]
-Date: _______________
-
-______________________________
-The ATM Agency
-Name: [Agency Rep Name]
-Date: _______________
-"""
+if 'template_id' not in st.session_state:
+    st.session_state.template_id = DEFAULT_TEMPLATE_ID
 
 # -----------------------------
 # UI Header
@@ -185,66 +108,194 @@ Date: _______________
 st.title("📄 Ad Manager & Partnership Agreement")
 st.markdown("### Commission-Based Ad Management Contract — The ATM Agency")
 st.markdown("---")
-st.markdown('<div class="info-box">🔎 This agreement establishes a 10% commission structure for ad-driven sales of digital products & courses. Review carefully before signing.</div>', unsafe_allow_html=True)
+
+template_ids = list(TEMPLATES)
+template_id = st.selectbox("Agreement Template", template_ids,
+                           index=template_ids.index(st.session_state.template_id),
+                           format_func=lambda t: TEMPLATES[t].name)
+if template_id != st.session_state.template_id:
+    # acceptance was given for the other template's terms
+    st.session_state.template_id = template_id
+    st.session_state.agreement_accepted = False
+template = get_template(template_id)
+
+st.markdown(f'<div class="info-box">🔎 This agreement establishes a {template.commission_rate:.0%} commission structure for ad-driven sales of digital products & courses. Review carefully before signing.</div>', unsafe_allow_html=True)
 
 # -----------------------------
 # Display agreement preview
 # -----------------------------
 with st.expander("📜 View Full Agreement Text", expanded=False):
-    st.markdown(agreement_text.replace("\n", "  \n"))
+    st.markdown(template.text.replace("\n", "  \n"))
 
-agreement_checkbox = st.checkbox(
+# keyed so that switching templates above can clear it
+st.checkbox(
     "✅ I have read, understand, and agree to the terms of this agreement",
-    value=st.session_state.agreement_accepted
+    key="agreement_accepted"
 )
-st.session_state.agreement_accepted = agreement_checkbox
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def is_valid_email(email: str) -> bool:
-    if not email:
-        return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def send_agreement_email(recipient_email, recipient_name, role, pdf_data, pdf_filename):
-    if not EMAIL_ADDRESS:
-        return False
+@st.cache_resource
+def get_mail_queue(settings):
+    from mailer import MailQueue
+
+    # one queue (and SMTP session) per server process, shared by all sessions
+    return MailQueue(settings)
+
+@st.cache_resource
+def get_render_pool():
+    from render_pool import RenderPool
+
+    return RenderPool(max_workers=RENDER_WORKERS, size_budget=PDF_SIZE_BUDGET)
+
+@st.cache_resource
+def get_agreement_store():
+    return AgreementStore(STORE_DIR)
+
+@st.cache_resource
+def get_session_artifacts():
+    return SessionArtifacts(ARTIFACT_MEMORY_MB * 1_000_000, ARTIFACT_IDLE_SECONDS)
+
+def current_session_id():
+    return get_script_run_ctx().session_id
+
+def queue_agreement_emails(details, pdf_data, pdf_filename, on_done=None, skip=()):
+    """Queue the agreement for everyone not in ``skip``; None when nobody is left."""
+    from mailer import agreement_recipients
+
+    recipients = agreement_recipients(details, SMTP_SETTINGS.admin_email, skip)
+    if not recipients:
+        return None
+    return get_mail_queue(SMTP_SETTINGS).submit(recipients, pdf_data, pdf_filename, on_done)
+
+def show_delivery_status(job_id):
+    job = get_mail_queue(SMTP_SETTINGS).get(job_id)
+    if job is None:
+        return
+    lines = [f"- {email}: {result}" for email, result in job.results.items()]
+    if job.status == "sent":
+        st.info("Agreement emailed to all parties.  \n" + "  \n".join(lines))
+    elif job.status in ("partial", "failed"):
+        st.warning("Email sending failed for some recipients - check SMTP configuration in Streamlit secrets.  \n" + "  \n".join(lines))
+    else:
+        st.info(f"Email delivery {job.status} (attempt {max(job.attempts, 1)})...")
+
+def finish_generated_agreement(job):
+    """Store the rendered PDF and queue its emails once the render has finished."""
+    if job["future"] is None or not job["future"].done():
+        return
+    store = get_agreement_store()
+    key = job["key"]
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = recipient_email
-        msg['Subject'] = f"Signed Ad Manager Agreement - The ATM Agency - {recipient_name}"
-        body = f"""Dear {recipient_name},
-
-Please find attached the signed Ad Manager & Partnership Agreement between The ATM Agency and {recipient_name}.
-
-Role: {role}
-Date Signed: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
-
-If you have any questions, reply to this email.
-
-Regards,
-The ATM Agency
-"""
-        msg.attach(MIMEText(body, 'plain'))
-
-        part = MIMEBase('application', 'octet-stream')
-        part.set_payload(pdf_data)
-        encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f'attachment; filename={pdf_filename}')
-        msg.attach(part)
-
-        server = smtplib.SMTP(SMTP_SERVER, int(PORT))
-        server.starttls()
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        return True
+        pdf_bytes = job["future"].result()
     except Exception as e:
-        st.error(f"Email send error: {e}")
+        job["future"] = None
+        job["error"] = str(e)
+        return
+    if not job["from_store"]:
+        store.put(key, pdf_bytes, job["details"], job["filename"],
+                  get_template(job["details"]["template_id"]).version_id)
+    # from here on the bytes live in the artifact manager, not in session state
+    get_session_artifacts().put(current_session_id(), key, pdf_bytes, store.blob_path(key))
+    job["future"] = None
+
+    # emails go out on the background mail queue, once per stored agreement
+    job["mail_job_id"] = None
+    if SMTP_SETTINGS and store.claim_email(key):
+        def record_delivery(mail_job):
+            # settled addresses are never emailed again; if anyone is left to
+            # retry, the claim is released for the next request
+            store.finish_email(key, mail_job.settled(), complete=not mail_job.retryable())
+        try:
+            mail_job = queue_agreement_emails(job["details"], pdf_bytes, job["filename"], record_delivery,
+                                              store.emailed_recipients(key))
+            job["mail_job_id"] = mail_job.id if mail_job is not None else None
+        except queue.Full:
+            store.release_email(key)
+            job["mail_queue_full"] = True
+
+def generated_agreement_pending(job):
+    if job["future"] is not None:
+        return True
+    mail_job_id = job.get("mail_job_id")
+    if mail_job_id is None:
         return False
+    mail_job = get_mail_queue(SMTP_SETTINGS).get(mail_job_id)
+    return mail_job is not None and not mail_job.done.is_set()
+
+def draw_generated_agreement(job):
+    if job["future"] is not None:
+        st.info("Creating PDF...")
+        return
+    if job.get("error"):
+        st.error(f"An error occurred while generating the PDF: {job['error']}")
+        return
+    if job["from_store"]:
+        st.success("This agreement was already generated - serving the stored copy.")
+    else:
+        st.success("Signed agreement created successfully.")
+
+    store = get_agreement_store()
+    artifacts = get_session_artifacts()
+    session_id = current_session_id()
+    key = job["key"]
+
+    def pdf_data():
+        # read on click, from memory or the spilled copy
+        return artifacts.get(session_id, key) or store.read(key)
+    st.download_button("⬇️ Download Signed Agreement PDF", data=pdf_data, file_name=job["filename"], mime="application/pdf")
+
+    if job.get("mail_queue_full"):
+        st.warning("The email queue is full - download the PDF and try sending again shortly.")
+    if job["mail_job_id"] is not None:
+        show_delivery_status(job["mail_job_id"])
+
+@st.fragment(run_every="1s")
+def poll_generated_agreement():
+    job = st.session_state.render_job
+    finish_generated_agreement(job)
+    draw_generated_agreement(job)
+    if not generated_agreement_pending(job):
+        # nothing left to wait for: a full rerun draws the final state without the timer
+        st.rerun()
+
+def show_generated_agreement():
+    job = st.session_state.get("render_job")
+    if job is None:
+        return
+    finish_generated_agreement(job)
+    # only poll while the render or the email delivery is still running
+    if generated_agreement_pending(job):
+        poll_generated_agreement()
+    else:
+        draw_generated_agreement(job)
+
+# -----------------------------
+# Past agreements (served from the store, never re-rendered)
+# -----------------------------
+with st.sidebar:
+    # stored agreements hold every client's contract and email, so the lookup
+    # is for admins only and matches one exact client email
+    if ADMIN_PASSWORD:
+        st.subheader("🔎 Past Agreements")
+        password = st.text_input("Admin password", type="password", key="past_agreements_password")
+        unlocked = hmac.compare_digest(password.encode(), ADMIN_PASSWORD.encode())
+        if password and not unlocked:
+            st.caption("Wrong password.")
+        past_email = st.text_input("Client email", key="past_agreements_email") if unlocked else ""
+        past = get_agreement_store().find_by_email(past_email) if past_email.strip() else []
+        if past_email.strip() and not past:
+            st.caption("No stored agreements for this email.")
+        for row in past:
+            st.download_button(
+                f"{row['filename']} ({row['created_at'][:10]})",
+                # read on click; listing matches must not load every PDF
+                data=lambda key=row["key"]: get_agreement_store().read(key),
+                file_name=row["filename"],
+                mime="application/pdf",
+                key=f"past_{row['key']}",
+            )
 
 # -----------------------------
 # Step 2: Enter Agreement Details
@@ -279,19 +330,10 @@ if st.session_state.agreement_accepted:
     st.session_state.state_law = state_law
 
     # validation
-    valid = True
-    if not client_name.strip():
-        st.error("Please enter the Client / Company name.")
-        valid = False
-    if not client_rep_name.strip():
-        st.error("Please enter the Client representative name.")
-        valid = False
-    if not is_valid_email(client_email):
-        st.error("Please enter a valid client email.")
-        valid = False
-    if not state_law.strip():
-        st.error("Please enter the governing state for law.")
-        valid = False
+    errors = validate_details({field: st.session_state[field] for field in AGREEMENT_FIELDS})
+    for error in errors:
+        st.error(error)
+    valid = not errors
 
     if valid:
         st.success("All required fields filled. Proceed to signatures below.")
@@ -301,7 +343,48 @@ else:
 # -----------------------------
 # Step 3: Signatures & PDF
 # -----------------------------
-if st.session_state.agreement_accepted and valid:
+def draw_signature_pad(pad):
+    """Show the ``pad`` ("client" or "agency") signature pad and its Clear button; returns the capture."""
+    if CANVAS_TRANSPORT == "strokes":
+        from signature_pad import clear_signature_pad, signature_pad
+
+        captured = signature_pad(f"{pad}_sig")
+    else:
+        from streamlit_drawable_canvas import st_canvas
+
+        captured = st_canvas(
+            fill_color="rgba(255, 255, 255, 0)",
+            stroke_width=2,
+            stroke_color="#000000",
+            background_color="#ffffff",
+            update_streamlit=True,
+            height=180,
+            width=700,
+            drawing_mode="freedraw",
+            key=f"{pad}_sig_canvas",
+        )
+    if st.button(f"Clear {pad.title()} Signature", key=f"clear_{pad}_sig"):
+        if CANVAS_TRANSPORT == "strokes":
+            clear_signature_pad(f"{pad}_sig")
+        else:
+            st.session_state.pop(f"{pad}_sig_canvas", None)
+        st.rerun(scope="fragment")
+    return captured
+
+def decode_signature(captured):
+    from signatures import Signature
+
+    if CANVAS_TRANSPORT == "strokes":
+        from strokes import PAD_HEIGHT, PAD_WIDTH
+
+        # pixels are only produced here, and only if the raster path needs them
+        return Signature.from_strokes(captured, PAD_WIDTH, PAD_HEIGHT)
+    return Signature.from_canvas(captured)
+
+# Drawing on a canvas reruns only this fragment, so strokes don't re-execute
+# the styling, secrets, agreement preview and form validation above.
+@st.fragment
+def signature_step():
     st.markdown("---")
     st.header("Step 2 — Digital Signatures")
 
@@ -310,40 +393,14 @@ if st.session_state.agreement_accepted and valid:
     # Client signature
     st.subheader("Client Signature")
     st.markdown(f"**Signing as:** {st.session_state.client_rep_name} (Client Representative)")
-    client_canvas = st_canvas(
-        fill_color="rgba(255, 255, 255, 0)",
-        stroke_width=2,
-        stroke_color="#000000",
-        background_color="#ffffff",
-        update_streamlit=True,
-        height=180,
-        width=700,
-        drawing_mode="freedraw",
-        key="client_sig_canvas",
-    )
-    if st.button("Clear Client Signature", key="clear_client_sig"):
-        st.session_state.pop("client_sig_canvas", None)
-        st.experimental_rerun()
+    client_canvas = draw_signature_pad("client")
 
     st.markdown("---")
 
     # Agency signature
     st.subheader("Agency Signature")
     st.markdown(f"**Signing as:** {st.session_state.agency_rep_name} (The ATM Agency)")
-    agency_canvas = st_canvas(
-        fill_color="rgba(255, 255, 255, 0)",
-        stroke_width=2,
-        stroke_color="#000000",
-        background_color="#ffffff",
-        update_streamlit=True,
-        height=180,
-        width=700,
-        drawing_mode="freedraw",
-        key="agency_sig_canvas",
-    )
-    if st.button("Clear Agency Signature", key="clear_agency_sig"):
-        st.session_state.pop("agency_sig_canvas", None)
-        st.experimental_rerun()
+    agency_canvas = draw_signature_pad("agency")
 
     # Generate PDF button
     st.markdown("---")
@@ -353,110 +410,48 @@ if st.session_state.agreement_accepted and valid:
 
     if generate_clicked:
         # check signatures exist
-        client_sig_exists = client_canvas.image_data is not None and client_canvas.image_data.sum() > 0
-        agency_sig_exists = agency_canvas.image_data is not None and agency_canvas.image_data.sum() > 0
-
-        if not client_sig_exists or not agency_sig_exists:
+        with metrics.timed(metrics.STAGE_SECONDS, "signature_decode"):
+            client_signature = decode_signature(client_canvas)
+            agency_signature = decode_signature(agency_canvas)
+            signatures_missing = client_signature.is_empty() or agency_signature.is_empty()
+        if metrics.enabled():
+            metrics.observe(metrics.PAYLOAD_BYTES, "signature", client_signature.payload_size())
+            metrics.observe(metrics.PAYLOAD_BYTES, "signature", agency_signature.payload_size())
+
+        if signatures_missing:
             st.warning("Both signatures are required to generate the signed PDF.")
         else:
-            with st.spinner("Creating PDF..."):
-                try:
-                    # personalize agreement text
-                    personalized = agreement_text.replace("[Client Name]", st.session_state.client_name)\
-                        .replace("[Effective Date]", st.session_state.effective_date.strftime("%B %d, %Y"))\
-                        .replace("[State]", st.session_state.state_law)\
-                        .replace("[Agency Rep Name]", st.session_state.agency_rep_name)
-
-                    # create temporary files
-                    with tempfile.TemporaryDirectory() as tmpdir:
-                        pdf_path = os.path.join(tmpdir, "Ad_Agreement.pdf")
-                        doc = SimpleDocTemplate(pdf_path, pagesize=LETTER,
-                                                rightMargin=72, leftMargin=72,
-                                                topMargin=72, bottomMargin=72)
-
-                        styles = getSampleStyleSheet()
-                        styles.add(ParagraphStyle(name='Justify', alignment=TA_JUSTIFY, fontSize=11, leading=14))
-                        styles.add(ParagraphStyle(name='CustomTitle', fontSize=14, alignment=TA_LEFT, spaceAfter=12, textColor='#0f172a'))
-
-                        elements = []
-                        # Title
-                        elements.append(Paragraph("Ad Manager & Partnership Agreement", styles['CustomTitle']))
-                        elements.append(Spacer(1, 0.1*inch))
-
-                        # Add personalized agreement body
-                        for block in personalized.strip().split('\n\n'):
-                            block = block.strip().replace('\n', '<br/>')
-                            elements.append(Paragraph(block, styles['Justify']))
-                            elements.append(Spacer(1, 0.12*inch))
-
-                        elements.append(PageBreak())
-                        elements.append(Paragraph("<b>SIGNATURES</b>", styles['CustomTitle']))
-                        elements.append(Spacer(1, 0.2*inch))
-
-                        # Save client signature image
-                        client_sig_path = os.path.join(tmpdir, "client_sig.png")
-                        client_img_arr = client_canvas.image_data
-                        # convert to PIL image
-                        client_img = Image.fromarray((client_img_arr).astype('uint8'))
-                        client_img = client_img.convert("RGBA")
-                        client_img.save(client_sig_path)
-
-                        elements.append(Paragraph("<b>Client Representative</b>", styles['Normal']))
-                        elements.append(Spacer(1, 0.08*inch))
-                        elements.append(RLImage(client_sig_path, width=3*inch, height=0.75*inch))
-                        elements.append(Paragraph(f"<b>Name:</b> {st.session_state.client_rep_name}", styles['Normal']))
-                        elements.append(Paragraph(f"<b>Company:</b> {st.session_state.client_name}", styles['Normal']))
-                        elements.append(Paragraph(f"<b>Email:</b> {st.session_state.client_email}", styles['Normal']))
-                        elements.append(Paragraph(f"<b>Date:</b> {datetime.now().strftime('%B %d, %Y')}", styles['Normal']))
-
-                        elements.append(Spacer(1, 0.4*inch))
-
-                        # Save agency signature image
-                        agency_sig_path = os.path.join(tmpdir, "agency_sig.png")
-                        agency_img_arr = agency_canvas.image_data
-                        agency_img = Image.fromarray((agency_img_arr).astype('uint8'))
-                        agency_img = agency_img.convert("RGBA")
-                        agency_img.save(agency_sig_path)
-
-                        elements.append(Paragraph("<b>The ATM Agency</b>", styles['Normal']))
-                        elements.append(Spacer(1, 0.08*inch))
-                        elements.append(RLImage(agency_sig_path, width=3*inch, height=0.75*inch))
-                        elements.append(Paragraph(f"<b>Name:</b> {st.session_state.agency_rep_name}", styles['Normal']))
-                        if st.session_state.agency_email:
-                            elements.append(Paragraph(f"<b>Email:</b> {st.session_state.agency_email}", styles['Normal']))
-                        elements.append(Paragraph(f"<b>Date:</b> {datetime.now().strftime('%B %d, %Y')}", styles['Normal']))
-
-                        # build pdf
-                        doc.build(elements)
-
-                        # read pdf bytes
-                        with open(pdf_path, "rb") as f:
-                            pdf_bytes = f.read()
-
-                        pdf_filename = f"Ad_Agreement_{st.session_state.client_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
-
-                        st.success("Signed agreement created successfully.")
-                        st.download_button("⬇️ Download Signed Agreement PDF", data=pdf_bytes, file_name=pdf_filename, mime="application/pdf")
-
-                        # attempt to email if config present
-                        if EMAIL_ADDRESS:
-                            with st.spinner("Sending agreement to parties via email..."):
-                                sent_client = send_agreement_email(st.session_state.client_email, st.session_state.client_rep_name, "Client Representative", pdf_bytes, pdf_filename)
-                                sent_agency = False
-                                if st.session_state.agency_email:
-                                    sent_agency = send_agreement_email(st.session_state.agency_email, st.session_state.agency_rep_name, "Agency Representative", pdf_bytes, pdf_filename)
-                                # admin copy
-                                sent_admin = False
-                                if ADMIN_EMAIL:
-                                    sent_admin = send_agreement_email(ADMIN_EMAIL, "Admin", "Admin Copy", pdf_bytes, pdf_filename)
-
-                                if sent_client or sent_agency or sent_admin:
-                                    st.info("Emails attempted. Check logs or inboxes.")
-                                else:
-                                    st.warning("Email sending failed - check SMTP configuration in Streamlit secrets.")
-
-                except Exception as e:
-                    st.error(f"An error occurred while generating the PDF: {e}")
+            details = normalized_details({field: st.session_state[field] for field in AGREEMENT_FIELDS})
+            signed_on = date.today()
+            try:
+                with metrics.timed(metrics.STAGE_SECONDS, "store_lookup"):
+                    key = agreement_key(details, client_signature, agency_signature, SIGNATURE_MODE, signed_on,
+                                        get_template(details["template_id"]).version_id, COMPACT_PDF)
+                    store = get_agreement_store()
+                    from_store = store.get(key) is not None
+                if from_store:
+                    # identical inputs: reuse the stored bytes, no rebuild
+                    future = Future()
+                    future.set_result(store.read(key))
+                else:
+                    # rendering happens on the worker pool; the fragment below polls it
+                    future = get_render_pool().submit(details, client_signature, agency_signature, SIGNATURE_MODE, signed_on,
+                                                     COMPACT_PDF)
+                st.session_state.render_job = {
+                    "future": future,
+                    "key": key,
+                    "from_store": from_store,
+                    "details": details,
+                    "filename": agreement_filename(details, signed_on),
+                }
+            except Exception as e:
+                st.error(f"An error occurred while generating the PDF: {e}")
+
+    show_generated_agreement()
+
+
+if st.session_state.agreement_accepted and valid:
+    signature_step()
 
 # Footer / disclaimer
 st.markdown("---")
@@ -466,3 +461,11 @@ st.markdown("""
     This is a legally binding agreement. Consult legal counsel for legal advice.
 </div>
 """, unsafe_allow_html=True)
+
+# time-to-first-render: the first full run of this session (the first session
+# on a fresh server also pays for imports and config parsing)
+run_ms = (time.perf_counter() - _run_started) * 1000
+metrics.observe(metrics.STAGE_SECONDS, "rerun", run_ms / 1000)
+if 'first_render_ms' not in st.session_state:
+    st.session_state.first_render_ms = run_ms
+st.caption(f"First render {st.session_state.first_render_ms:.0f} ms · this run {run_ms:.0f} ms")
@@ -0,0 +1,134 @@
+"""Per-session artifacts (generated PDFs) under one process-wide memory budget.
+
+Artifacts are kept in memory while they fit in the budget. Past it, the
+least recently used sessions are spilled first: an artifact that already has
+a copy on disk (``path``) just drops its in-memory bytes, anything else is
+written to the spill directory. Spilled artifacts are read back from disk on
+``get``; sessions unused for ``expire_seconds`` are forgotten entirely.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class _Artifact:
+    __slots__ = ("data", "path", "size", "owned")
+
+    def __init__(self, data, path):
+        self.data = data
+        self.path = path
+        self.size = len(data)
+        # True when the spill file is ours to delete
+        self.owned = False
+
+
+class SessionArtifacts:
+    def __init__(self, memory_budget=64_000_000, idle_seconds=300, expire_seconds=24 * 3600, spill_dir=None):
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self.expire_seconds = expire_seconds
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="agreement-artifacts-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # session id -> (last used, {name: _Artifact}), least recently used first
+        self._sessions = OrderedDict()
+        self._in_memory = 0
+
+    def put(self, session_id, name, data, path=None):
+        """Keep ``data`` for the session; ``path`` is an existing on-disk copy, if any."""
+        with self._lock:
+            _, items = self._touch(session_id)
+            self._discard(items.pop(name, None))
+            items[name] = _Artifact(data, path)
+            self._in_memory += len(data)
+            self._enforce(time.monotonic())
+
+    def get(self, session_id, name):
+        """The artifact's bytes, from memory or its spilled copy; None when unknown."""
+        with self._lock:
+            if session_id not in self._sessions:
+                return None
+            artifact = self._touch(session_id)[1].get(name)
+            if artifact is None:
+                return None
+            if artifact.data is not None:
+                return artifact.data
+            path = artifact.path
+        # read outside the lock; the file is only removed by drop/expiry
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def drop(self, session_id):
+        with self._lock:
+            _, items = self._sessions.pop(session_id, (None, {}))
+            for artifact in items.values():
+                self._discard(artifact)
+
+    def stats(self):
+        with self._lock:
+            spilled = sum(a.size for _, items in self._sessions.values() for a in items.values() if a.data is None)
+            return {"sessions": len(self._sessions), "in_memory": self._in_memory, "spilled": spilled}
+
+    def close(self):
+        with self._lock:
+            self._sessions.clear()
+            self._in_memory = 0
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # -- internals, called with the lock held --
+
+    def _touch(self, session_id):
+        _, items = self._sessions.pop(session_id, (None, {}))
+        entry = self._sessions[session_id] = (time.monotonic(), items)
+        return entry
+
+    def _discard(self, artifact):
+        if artifact is None:
+            return
+        if artifact.data is not None:
+            self._in_memory -= artifact.size
+        elif artifact.owned:
+            try:
+                os.remove(artifact.path)
+            except OSError:
+                pass
+
+    def _spill(self, session_id, artifact):
+        if artifact.path is None:
+            name = f"{session_id}-{id(artifact):x}.bin"
+            artifact.path = os.path.join(self.spill_dir, name)
+            artifact.owned = True
+            with open(artifact.path, "wb") as f:
+                f.write(artifact.data)
+        artifact.data = None
+        self._in_memory -= artifact.size
+        metrics.observe(metrics.PAYLOAD_BYTES, "artifact_spill", artifact.size)
+
+    def _enforce(self, now):
+        for session_id, (last_used, items) in list(self._sessions.items()):
+            if now - last_used <= self.expire_seconds:
+                break
+            del self._sessions[session_id]
+            for artifact in items.values():
+                self._discard(artifact)
+
+        if self._in_memory <= self.memory_budget:
+            return
+        # idle sessions first; if that is not enough, active ones too (oldest first)
+        for idle_only in (True, False):
+            for session_id, (last_used, items) in list(self._sessions.items()):
+                if idle_only and now - last_used < self.idle_seconds:
+                    break
+                for artifact in items.values():
+                    if artifact.data is not None:
+                        self._spill(session_id, artifact)
+                if self._in_memory <= self.memory_budget:
+                    return
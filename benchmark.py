@@ -0,0 +1,271 @@
+"""Per-stage benchmarks for the signing path.
+
+Times each stage of Generate on its own over a range of inputs and writes the
+results as JSON, so runs from different commits can be compared:
+
+    python benchmark.py --out bench.json
+    python benchmark.py --out new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from agreement import placeholder_values
+from agreement_pdf import AgreementLayout, build_agreement_pdf, get_agreement_layout
+from config import SmtpSettings
+from local_smtp import LocalSMTPServer
+from mailer import MailQueue, agreement_message, attachment_part
+from signatures import Signature
+from templates import CompiledText, get_template
+
+NAME_LENGTHS = (12, 200, 2000)
+CANVAS_SIZES = ((700, 180), (1400, 360), (2800, 720))
+RECIPIENT_COUNTS = (1, 3, 10, 25)
+
+
+# -----------------------------
+# Synthetic inputs
+# -----------------------------
+def sample_details(name_length=12):
+    name = ("Client Company " * (name_length // 15 + 1))[:name_length].strip()
+    return {
+        "client_name": name,
+        "client_rep_name": "Jane Client",
+        "client_email": "jane@client.com",
+        "agency_rep_name": "The ATM Agency Representative",
+        "agency_email": "rep@theatm.agency",
+        "effective_date": date(2026, 1, 1),
+        "state_law": "Delaware",
+        "template_id": "ad-manager",
+    }
+
+
+def sample_signature(width=700, height=180, strokes=6, seed=0):
+    """A scribble as fabric.js freedraw paths plus the matching RGBA canvas."""
+    rng = random.Random(seed)
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    paths = []
+    for _ in range(strokes):
+        x, y = rng.uniform(0.1, 0.9) * width, rng.uniform(0.3, 0.7) * height
+        path, points = [["M", x, y]], [(x, y)]
+        for _ in range(40):
+            qx, qy = x + rng.uniform(-8, 8) * width / 700, y + rng.uniform(-8, 8) * height / 180
+            x = min(max(qx + rng.uniform(-8, 8), 0), width)
+            y = min(max(qy + rng.uniform(-8, 8), 0), height)
+            path.append(["Q", qx, qy, x, y])
+            points.append((x, y))
+        draw.line(points, fill=(0, 0, 0, 255), width=2)
+        paths.append({"type": "path", "strokeWidth": 2, "stroke": "#000000", "path": path})
+    return Signature(paths, np.asarray(img))
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(stage, params, samples, **extra):
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "stage": stage,
+        "params": params,
+        "n": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "median_ms": statistics.median(ms),
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "min_ms": ms[0],
+        **extra,
+    }
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+def bench_substitution(repeat):
+    template = get_template()
+    yield summarize("template_compile", {}, measure(lambda: CompiledText(template.text), repeat * 20))
+    for length in NAME_LENGTHS:
+        values = placeholder_values(sample_details(length))
+
+        def replace_chain():
+            text = template.text
+            for placeholder, value in values.items():
+                text = text.replace(placeholder, value)
+            return text
+        yield summarize("substitution", {"name_length": length}, measure(replace_chain, repeat * 20))
+        yield summarize("compiled_render", {"name_length": length},
+                        measure(lambda: template.render(values), repeat * 20))
+
+
+def bench_canvas(repeat):
+    for width, height in CANVAS_SIZES:
+        signature = sample_signature(width, height)
+        params = {"canvas": f"{width}x{height}"}
+        yield summarize("canvas_to_pil", params, measure(
+            lambda: Image.fromarray(signature.image_data.astype('uint8')).convert("RGBA"), repeat))
+        yield summarize("signature_raster", params, measure(lambda: signature.flowable("raster"), repeat))
+        yield summarize("signature_vector", params, measure(lambda: signature.flowable("vector"), repeat))
+
+
+def bench_flowables(repeat):
+    yield summarize("layout_cold", {}, measure(lambda: AgreementLayout(get_template()), repeat))
+    for length in NAME_LENGTHS:
+        values = placeholder_values(sample_details(length))
+        yield summarize("body_flowables", {"name_length": length}, measure(
+            lambda: get_agreement_layout().body_flowables(values), repeat))
+
+
+def bench_build(repeat):
+    for length in NAME_LENGTHS:
+        details = sample_details(length)
+        for width, height in CANVAS_SIZES:
+            signature = sample_signature(width, height)
+            for mode in ("vector", "raster"):
+                for compact in (False, True):
+                    pdf_sizes = []
+
+                    def build():
+                        pdf_sizes.append(len(build_agreement_pdf(details, signature, signature, mode,
+                                                                 compact=compact)))
+                    samples = measure(build, repeat)
+                    params = {"name_length": length, "canvas": f"{width}x{height}", "mode": mode}
+                    if compact:
+                        params["compact"] = True
+                    yield summarize("doc_build", params, samples, pdf_bytes=pdf_sizes[-1])
+
+
+def bench_mime(repeat, pdf_data):
+    signed_at = datetime(2026, 1, 1, 12, 0)
+    for count in RECIPIENT_COUNTS:
+        def assemble():
+            attachment = attachment_part(pdf_data, "Ad_Agreement.pdf")
+            for i in range(count):
+                agreement_message("agency@example.com", f"r{i}@example.com", "Recipient", "Client", attachment, signed_at).as_bytes()
+        yield summarize("mime_assembly", {"recipients": count, "pdf_bytes": len(pdf_data)}, measure(assemble, repeat))
+
+
+def bench_send(repeat, pdf_data):
+    with LocalSMTPServer() as server:
+        settings = SmtpSettings("127.0.0.1", server.port, "agency@example.com", use_tls=False)
+        mail_queue = MailQueue(settings)
+        try:
+            for count in RECIPIENT_COUNTS:
+                recipients = [(f"r{i}@example.com", "Recipient", "Client") for i in range(count)]
+
+                def send():
+                    job = mail_queue.submit(recipients, pdf_data, "Ad_Agreement.pdf")
+                    job.done.wait()
+                    if job.status != "sent":
+                        raise RuntimeError(f"local send failed: {job.results}")
+                yield summarize("smtp_send", {"recipients": count}, measure(send, repeat))
+        finally:
+            mail_queue.close()
+
+
+def run(repeat=20, stages=None):
+    pdf_data = build_agreement_pdf(sample_details(), sample_signature(), sample_signature(seed=1))
+    suites = {
+        "substitution": lambda: bench_substitution(repeat),
+        "canvas": lambda: bench_canvas(repeat),
+        "flowables": lambda: bench_flowables(repeat),
+        "build": lambda: bench_build(repeat),
+        "mime": lambda: bench_mime(repeat, pdf_data),
+        "send": lambda: bench_send(repeat, pdf_data),
+    }
+    results = []
+    for name, suite in suites.items():
+        if stages and name not in stages:
+            continue
+        for result in suite():
+            print(f"{result['stage']:<18} {json.dumps(result['params']):<60} "
+                  f"median {result['median_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _key(result):
+    return result["stage"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Print median ratios against ``baseline``; return the regressed stages."""
+    previous = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(_key(result))
+        if before is None or not before["median_ms"]:
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        flag = "REGRESSION" if ratio > tolerance else ""
+        print(f"{result['stage']:<18} {json.dumps(result['params']):<60} x{ratio:5.2f} {flag}", file=sys.stderr)
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the signing path.")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--stage", action="append", dest="stages",
+                        choices=("substitution", "canvas", "flowables", "build", "mime", "send"),
+                        help="only run these stages (repeatable)")
+    parser.add_argument("--out", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="median slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": _commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": run(args.repeat, args.stages),
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Generate personalized agreements in bulk from a CSV or JSONL file.
+
+Each row needs the form fields (client_name, client_rep_name, client_email,
+agency_rep_name, effective_date as YYYY-MM-DD, state_law; agency_email is
+optional; template_id picks a registered template, the standard one by
+default) and may name pre-captured signature images in client_signature /
+agency_signature. Rows whose output already exists are skipped, so an
+interrupted run can be resumed with the same command.
+
+    python bulk_generate.py clients.csv --out agreements/
+    python bulk_generate.py clients.jsonl --out agreements.zip --workers 8
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date
+from pathlib import Path
+
+from agreement import AGREEMENT_FIELDS, DEFAULT_AGENCY_REP, agreement_filename, validate_details
+from agreement_pdf import build_agreement_pdf
+from compact_pdf import size_report
+from render_pool import warm_worker
+from signatures import Signature
+from templates import DEFAULT_TEMPLATE_ID
+
+
+# -----------------------------
+# Input
+# -----------------------------
+def read_rows(path):
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def row_details(row):
+    details = {field: (row.get(field) or "").strip() for field in AGREEMENT_FIELDS}
+    details["agency_rep_name"] = details["agency_rep_name"] or DEFAULT_AGENCY_REP
+    details["template_id"] = details["template_id"] or DEFAULT_TEMPLATE_ID
+    details["effective_date"] = date.fromisoformat(details["effective_date"])
+    return details
+
+
+def output_name(index, details):
+    # the row number keeps names unique and stable across resumed runs
+    return f"{index:05d}_{agreement_filename(details, details['effective_date'])}"
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+def _load_signature(path, base_dir):
+    if not path:
+        return Signature()
+    return Signature.from_image_file(Path(base_dir, path))
+
+
+def render_row(details, client_sig_path, agency_sig_path, base_dir, compact=False):
+    client_signature = _load_signature(client_sig_path, base_dir)
+    agency_signature = _load_signature(agency_sig_path, base_dir)
+    # pre-captured signatures are images, so they are always embedded as rasters
+    return build_agreement_pdf(details, client_signature, agency_signature, "raster", compact=compact)
+
+
+# -----------------------------
+# Output sinks
+# -----------------------------
+class DirectorySink:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def exists(self, name):
+        try:
+            return (self.path / name).exists()
+        except OSError:
+            # e.g. a name too long for the filesystem; write() reports it for the row
+            return False
+
+    def write(self, name, data):
+        # write then rename so an interrupted run never leaves a partial PDF
+        tmp = self.path / (name + ".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path / name)
+
+    def close(self):
+        pass
+
+
+class ZipSink:
+    """Stages PDFs in a directory next to the archive and zips them on close.
+
+    A run killed mid-way leaves its rows in the staging directory rather than
+    in an archive without a central directory, so the rerun still skips them.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.exists() and not zipfile.is_zipfile(self.path):
+            raise zipfile.BadZipFile(f"{self.path} is not a complete zip archive")
+        self._names = set()
+        if self.path.exists():
+            with zipfile.ZipFile(self.path) as archive:
+                self._names = set(archive.namelist())
+        self._staging = DirectorySink(self.path.with_name(self.path.name + ".parts"))
+
+    def exists(self, name):
+        return name in self._names or self._staging.exists(name)
+
+    def write(self, name, data):
+        self._staging.write(name, data)
+
+    def close(self):
+        staged = sorted(p for p in self._staging.path.iterdir() if p.suffix == ".pdf")
+        if staged:
+            # add to a copy and swap it in, so the archive is complete at every point
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            if self.path.exists():
+                shutil.copyfile(self.path, tmp)
+            # PDF streams are already compressed
+            with zipfile.ZipFile(tmp, "a", compression=zipfile.ZIP_STORED) as archive:
+                for part in staged:
+                    if part.name not in self._names:
+                        archive.write(part, part.name)
+            os.replace(tmp, self.path)
+        shutil.rmtree(self._staging.path)
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def generate(input_path, out, workers=None, progress_every=100, compact=False, size_budget=None):
+    sink = ZipSink(out) if str(out).lower().endswith(".zip") else DirectorySink(out)
+    base_dir = Path(input_path).parent
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    stats = {"written": 0, "skipped": 0, "invalid": 0, "failed": 0, "over_budget": 0, "bytes": 0}
+    started = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - started
+        rate = stats["written"] / elapsed if elapsed else 0.0
+        print(f"{'done' if final else 'progress'}: {stats['written']} written, {stats['skipped']} skipped, "
+              f"{stats['invalid']} invalid, {stats['failed']} failed, {stats['over_budget']} over budget "
+              f"in {elapsed:.1f}s ({rate:.1f} agreements/s, {stats['bytes'] / 1e6:.1f} MB)", file=sys.stderr)
+
+    def collect(done):
+        for future in done:
+            name = in_flight.pop(future)
+            try:
+                data = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"{name}: {e}", file=sys.stderr)
+                continue
+            if size_budget and len(data) > size_budget:
+                sizes = size_report(data)
+                stats["over_budget"] += 1
+                print(f"{name}: {sizes['total']} bytes, over the {size_budget} byte budget (text {sizes['text']}, "
+                      f"images {sizes['images']}, fonts {sizes['fonts']})", file=sys.stderr)
+            try:
+                sink.write(name, data)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"{name}: {e}", file=sys.stderr)
+                continue
+            stats["written"] += 1
+            stats["bytes"] += len(data)
+            if stats["written"] % progress_every == 0:
+                report()
+
+    in_flight = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=warm_worker) as executor:
+            for index, row in enumerate(read_rows(input_path), start=1):
+                try:
+                    details = row_details(row)
+                    errors = validate_details(details)
+                except (AttributeError, TypeError, ValueError) as e:
+                    errors = [str(e)]
+                if errors:
+                    stats["invalid"] += 1
+                    print(f"row {index}: {' '.join(errors)}", file=sys.stderr)
+                    continue
+
+                name = output_name(index, details)
+                if sink.exists(name):
+                    stats["skipped"] += 1
+                    continue
+
+                # bound the number of queued rows so memory stays flat on large inputs
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = executor.submit(render_row, details, row.get("client_signature"),
+                                         row.get("agency_signature"), base_dir, compact)
+                in_flight[future] = name
+            collect(list(in_flight))
+    finally:
+        sink.close()
+    report(final=True)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Ad Manager agreements in bulk.")
+    parser.add_argument("input", help="CSV or JSONL file with one client per row")
+    parser.add_argument("--out", required=True, help="output directory, or a .zip file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--compact", action="store_true", help="write compact PDFs (see agreement_pdf)")
+    parser.add_argument("--size-budget", type=int, default=None, help="report PDFs larger than this many bytes")
+    args = parser.parse_args(argv)
+
+    stats = generate(args.input, args.out, args.workers, compact=args.compact, size_budget=args.size_budget)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
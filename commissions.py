@@ -0,0 +1,429 @@
+"""Monthly commission statements from sales exports.
+
+A sales export (CSV or Parquet, one row per transaction) is read in record
+batches through pyarrow, so files with millions of rows never have to fit
+in memory. Gross revenue is summed per client and calendar month with numpy.
+Each client's commission rate for a month comes from the template of the
+agreement in force that month: the one in the agreement store with the
+latest effective date on or before the first of the month. An agreement
+that takes effect mid-month applies from the next month, so sales made
+before it never get its rate. Per Section 2 of the agreement, the
+commission is a share of gross revenue before refunds (negative rows are
+listed but not deducted), due within 7 days of each completed month.
+
+    python commissions.py sales.parquet --summary --out commissions.csv
+    python commissions.py sales.csv --client "Acme LLC" --month 2026-09 --out acme-2026-09.pdf
+
+A statement lists every transaction of the month in export order. Its table
+is drawn page by page from a second pass over the export, and each page is
+compressed as soon as it is finished, so memory stays flat however many line
+items there are.
+"""
+import argparse
+import csv
+import math
+import sys
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import csv as pacsv
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream, PDFZCompress
+from reportlab.pdfgen.canvas import Canvas
+
+from agreement_store import AgreementStore
+from templates import template_for_version
+
+BATCH_ROWS = 65_536
+# batches pyarrow decodes ahead of the one being processed
+READAHEAD = 2
+# commission for a month is due by this day of the next month
+PAYMENT_DAY = 7
+
+
+class SalesColumns(NamedTuple):
+    client: str = "client_name"
+    date: str = "date"
+    # transaction amount in dollars; negative amounts are refunds
+    amount: str = "gross_revenue"
+    # optional order or transaction id, shown on statements
+    reference: Optional[str] = None
+
+
+# -----------------------------
+# Input
+# -----------------------------
+def open_sales(path, columns=SalesColumns()):
+    if str(path).lower().endswith((".parquet", ".pq")):
+        return ds.dataset(path, format="parquet")
+    types = {columns.client: pa.string(), columns.amount: pa.float64()}
+    if columns.reference:
+        types[columns.reference] = pa.string()
+    # empty cells are missing values, not empty client names
+    options = pacsv.ConvertOptions(column_types=types, strings_can_be_null=True)
+    return ds.dataset(path, format=ds.CsvFileFormat(convert_options=options))
+
+
+def _days(array):
+    if not (pa.types.is_timestamp(array.type) or pa.types.is_date(array.type)):
+        # ISO 8601 text, with or without a time
+        array = array.cast(pa.timestamp("s"))
+    return array.to_numpy(zero_copy_only=False).astype("datetime64[D]")
+
+
+def iter_sales(dataset, columns=SalesColumns(), client=None, batch_rows=BATCH_ROWS):
+    """Yield ``(clients, days, cents, references)`` for each record batch.
+
+    ``clients`` (and ``references``, None without a reference column) are
+    pyarrow arrays, ``days`` is ``datetime64[D]`` and ``cents`` int64. Rows
+    missing a client, date or amount are skipped. ``client`` restricts the
+    scan to one client's rows.
+    """
+    names = [columns.client, columns.date, columns.amount] + ([columns.reference] if columns.reference else [])
+    scan_filter = ds.field(columns.client) == client if client is not None else None
+    for batch in dataset.to_batches(columns=names, filter=scan_filter, batch_size=batch_rows,
+                                    batch_readahead=READAHEAD, fragment_readahead=1):
+        valid = pc.and_(pc.and_(pc.is_valid(batch.column(0)), pc.is_valid(batch.column(1))),
+                        pc.is_valid(batch.column(2)))
+        if valid.false_count:
+            batch = batch.filter(valid)
+        if not batch.num_rows:
+            continue
+        cents = np.rint(batch.column(2).cast(pa.float64()).to_numpy() * 100).astype(np.int64)
+        yield (batch.column(0), _days(batch.column(1)), cents,
+               batch.column(3).cast(pa.string()) if columns.reference else None)
+
+
+# -----------------------------
+# Aggregation
+# -----------------------------
+def _reduce(keys, values):
+    """Sum ``values`` rows that share a key; returns the sorted unique keys and their sums."""
+    if not len(keys):
+        return keys, values
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.add.reduceat(values, starts, axis=0)
+
+
+class MonthlyTotals:
+    """Gross revenue, refunds (both in cents) and transaction counts per client and month."""
+
+    def __init__(self):
+        self.client_names = []
+        self._client_ids = {}
+        self._keys = np.empty(0, dtype=np.int64)
+        # gross, refunds, transactions
+        self._sums = np.empty((0, 3), dtype=np.int64)
+
+    def add(self, clients, days, cents):
+        # client names become small ints through the batch's dictionary, so
+        # no per-row Python work is done
+        encoded = clients.dictionary_encode()
+        lookup = np.array([self._client_ids.setdefault(name, len(self._client_ids))
+                           for name in encoded.dictionary.to_pylist()], dtype=np.int64)
+        self.client_names.extend(list(self._client_ids)[len(self.client_names):])
+        client_ids = lookup[encoded.indices.to_numpy()]
+        months = days.astype("datetime64[M]").astype(np.int64)
+        # one key per (client, month): client id in the high 32 bits, month in the low ones
+        keys = (client_ids << 32) | (months + 2**31)
+        values = np.column_stack((np.maximum(cents, 0), np.maximum(-cents, 0), np.ones_like(cents)))
+        self._keys, self._sums = _reduce(np.concatenate((self._keys, keys)), np.concatenate((self._sums, values)))
+
+    def rows(self):
+        """``(client, "YYYY-MM", gross, refunds, transactions)`` tuples, by client and month."""
+        months = ((self._keys & 0xFFFFFFFF) - 2**31).astype("datetime64[M]")
+        return sorted((self.client_names[client], str(month), int(gross), int(refunds), int(count))
+                      for client, month, (gross, refunds, count) in zip(self._keys >> 32, months, self._sums))
+
+    def get(self, client, month):
+        """``(gross, refunds, transactions)`` for one client and month; zeros when there were no sales."""
+        for row in self.rows():
+            if row[:2] == (client, month):
+                return row[2:]
+        return 0, 0, 0
+
+
+def aggregate(path, columns=SalesColumns(), client=None, batch_rows=BATCH_ROWS):
+    totals = MonthlyTotals()
+    for clients, days, cents, _ in iter_sales(open_sales(path, columns), columns, client, batch_rows):
+        totals.add(clients, days, cents)
+    return totals
+
+
+# -----------------------------
+# Commission
+# -----------------------------
+def agreement_in_force(agreements, month):
+    """The latest of ``agreements`` (by ``effective_from``) effective on the first of ``month``, or None."""
+    first = f"{month}-01"
+    in_force = None
+    for row in agreements:
+        if row["effective_from"] > first:
+            break
+        in_force = row
+    return in_force
+
+
+def _rate(row):
+    if row is None:
+        return None, None
+    return template_for_version(row["template_version"]).commission_rate, row
+
+
+def agreement_rate(store, client_name, month, key=None):
+    """``(rate, agreement row)`` from the agreement in force in ``month`` (or ``key``); Nones when there is none."""
+    if key:
+        return _rate(store.get(key))
+    return _rate(agreement_in_force(store.agreements_for_client(client_name), month))
+
+
+def commission(gross_cents, rate):
+    """Commission in whole cents, rounded half up."""
+    return int((Decimal(gross_cents) * Decimal(str(rate))).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def payment_due(month):
+    first = date.fromisoformat(f"{month}-01")
+    return date(first.year + first.month // 12, first.month % 12 + 1, PAYMENT_DAY)
+
+
+def money(cents):
+    return f"{'-' if cents < 0 else ''}${abs(cents) / 100:,.2f}"
+
+
+# -----------------------------
+# Statement PDF
+# -----------------------------
+class _CompressingCanvas(Canvas):
+    """Canvas that deflates each page's content stream as soon as the page is finished.
+
+    ReportLab keeps page content as text until ``save``; on a statement with
+    thousands of table pages that text would dominate memory.
+    """
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        page.Contents = PDFStream(PDFDictionary({"Filter": PDFArray([PDFName(PDFZCompress.pdfname)])}),
+                                  PDFZCompress.encode(page.stream))
+        page.stream = None
+
+
+class StatementLayout:
+    page_width, page_height = LETTER
+    margin = 0.75*inch
+    row_height = 12
+    header_height = 2.2*inch
+    font_size = 8
+
+    def __init__(self, with_references):
+        self.with_references = with_references
+        left, right = self.margin, self.page_width - self.margin
+        # (x, alignment) per column: row number, date, reference, amount
+        self.columns = [(left + 36, "right"), (left + 48, "left"), (left + 120, "left"), (right, "right")]
+        self.table_top = self.page_height - self.margin - 0.3*inch
+        self.table_bottom = self.margin + 0.3*inch
+        self.rows_per_page = int((self.table_top - self.table_bottom) // self.row_height) - 1
+        self.first_page_rows = int((self.table_top - self.header_height - self.table_bottom) // self.row_height) - 1
+
+    def page_count(self, rows):
+        return 1 + math.ceil(max(0, rows - self.first_page_rows) / self.rows_per_page)
+
+    def draw_row(self, canv, y, cells):
+        for (x, align), text in zip(self.columns, cells):
+            if text:
+                if align == "right":
+                    canv.drawRightString(x, y, text)
+                else:
+                    canv.drawString(x, y, text)
+
+    def draw_table_header(self, canv, top):
+        canv.setFont("Helvetica-Bold", self.font_size)
+        self.draw_row(canv, top - self.row_height, ("#", "Date", "Reference" if self.with_references else "", "Amount"))
+        # rows are drawn in the regular face from here to the end of the page
+        canv.setFont("Helvetica", self.font_size)
+        canv.setLineWidth(0.5)
+        canv.setStrokeColor("#94a3b8")
+        canv.line(self.margin, top - self.row_height - 3, self.page_width - self.margin, top - self.row_height - 3)
+        return top - 2 * self.row_height
+
+    def draw_footer(self, canv, label, page, pages):
+        canv.saveState()
+        canv.setFont("Helvetica", 7)
+        canv.setFillColor("#64748b")
+        canv.drawString(self.margin, 0.5*inch, label)
+        canv.drawRightString(self.page_width - self.margin, 0.5*inch, f"Page {page} of {pages}")
+        canv.restoreState()
+
+
+def build_statement(out, path, client, month, rate, columns=SalesColumns(), agreement=None, totals=None,
+                    batch_rows=BATCH_ROWS):
+    """Write the commission statement for ``client`` and ``month`` ("YYYY-MM") to ``out`` (a path or binary file).
+
+    ``agreement`` is the store row the rate came from, if any; ``totals`` is
+    an existing ``MonthlyTotals`` covering the client, to skip the first pass.
+    Returns the statement's figures.
+    """
+    totals = totals or aggregate(path, columns, client, batch_rows)
+    gross, refunds, transactions = totals.get(client, month)
+    due = commission(gross, rate)
+    layout = StatementLayout(bool(columns.reference))
+    pages = layout.page_count(transactions)
+    label = f"Commission statement · {client} · {month}"
+
+    canv = _CompressingCanvas(out, pagesize=LETTER, invariant=1, pageCompression=0)
+    canv.setTitle(f"Commission Statement {month}")
+    canv.setAuthor("The ATM Agency")
+    canv.setSubject(f"{client}: {month}")
+    canv.setCreator("The ATM Agency Agreement System")
+
+    # summary block
+    top = layout.page_height - layout.margin
+    canv.setFont("Helvetica-Bold", 14)
+    canv.setFillColor("#0f172a")
+    canv.drawString(layout.margin, top - 14, f"Commission Statement — {date.fromisoformat(month + '-01'):%B %Y}")
+    canv.setFillColor("#000000")
+    if agreement is not None:
+        template = template_for_version(agreement["template_version"])
+        effective = agreement["effective_date"] or agreement["created_at"][:10]
+        source = f"{template.name} (effective {effective}, {agreement['template_version']})"
+    else:
+        source = "rate set for this statement"
+    lines = [
+        ("Client", client),
+        ("Agreement", source),
+        ("Commission rate", f"{rate * 100:g}%"),
+        ("Gross revenue", f"{money(gross)} from {transactions:,} transactions"),
+        ("Refunds (not deducted)", money(refunds)),
+        ("Commission due", money(due)),
+        ("Payment due by", f"{payment_due(month):%B %d, %Y}"),
+    ]
+    y = top - 40
+    for name, value in lines:
+        canv.setFont("Helvetica-Bold", 10)
+        canv.drawString(layout.margin, y, name)
+        canv.setFont("Helvetica", 10)
+        canv.drawString(layout.margin + 1.7*inch, y, value)
+        y -= 15
+    canv.setFont("Helvetica-Bold", 11)
+    canv.drawString(layout.margin, layout.table_top - layout.header_height + 0.1*inch, "Transactions")
+
+    # transactions, one page at a time
+    page = 1
+    y = layout.draw_table_header(canv, layout.table_top - layout.header_height)
+    room = layout.first_page_rows
+    if not transactions:
+        layout.draw_row(canv, y, ("", "No transactions this month.", "", ""))
+    number = 0
+    target = np.datetime64(month, "M")
+    for _, days, cents, references in iter_sales(open_sales(path, columns), columns, client, batch_rows):
+        in_month = days.astype("datetime64[M]") == target
+        if not in_month.any():
+            continue
+        dates = np.datetime_as_string(days[in_month])
+        amounts = cents[in_month]
+        refs = references.filter(pa.array(in_month)).to_pylist() if references is not None else None
+        for i in range(len(dates)):
+            if not room:
+                layout.draw_footer(canv, label, page, pages)
+                canv.showPage()
+                page += 1
+                y = layout.draw_table_header(canv, layout.table_top)
+                room = layout.rows_per_page
+            number += 1
+            layout.draw_row(canv, y, (str(number), dates[i], refs[i] if refs else "", money(int(amounts[i]))))
+            y -= layout.row_height
+            room -= 1
+    layout.draw_footer(canv, label, page, pages)
+    canv.showPage()
+    canv.save()
+    return {"client": client, "month": month, "gross": gross, "refunds": refunds, "transactions": transactions,
+            "rate": rate, "commission": due, "pages": page}
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def write_summary(totals, store, rate=None, out=sys.stdout):
+    writer = csv.writer(out)
+    writer.writerow(["client", "month", "gross_revenue", "refunds", "transactions", "commission_rate",
+                     "commission", "payment_due"])
+    agreements = {}
+    missing = {}
+    for client, month, gross, refunds, transactions in totals.rows():
+        client_rate = rate
+        if client_rate is None:
+            # one store query per client; the agreement in force is picked per month
+            if client not in agreements:
+                agreements[client] = store.agreements_for_client(client)
+            client_rate = _rate(agreement_in_force(agreements[client], month))[0]
+        if client_rate is None:
+            missing.setdefault(client, []).append(month)
+        writer.writerow([client, month, f"{gross / 100:.2f}", f"{refunds / 100:.2f}", transactions,
+                         "" if client_rate is None else client_rate,
+                         "" if client_rate is None else f"{commission(gross, client_rate) / 100:.2f}",
+                         payment_due(month).isoformat()])
+    for client in sorted(missing):
+        print(f"{client}: no agreement in force for {', '.join(missing[client])}; commission left blank",
+              file=sys.stderr)
+    return missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate sales exports and write commission statements.")
+    parser.add_argument("input", help="CSV or Parquet sales export, one row per transaction")
+    parser.add_argument("--summary", action="store_true", help="write per-client, per-month totals as CSV")
+    parser.add_argument("--client", help="client name (as on the agreement) to write a statement for")
+    parser.add_argument("--month", help="statement month, YYYY-MM")
+    parser.add_argument("--out", help="statement PDF, or summary CSV (default: stdout)")
+    parser.add_argument("--rate", type=float, help="commission rate to apply instead of the agreement's, e.g. 0.1")
+    parser.add_argument("--agreement", help="key of the stored agreement to take the rate from")
+    parser.add_argument("--store-dir", default="agreement_store", help="signed-agreement store (default: %(default)s)")
+    defaults = SalesColumns()
+    parser.add_argument("--client-column", default=defaults.client)
+    parser.add_argument("--date-column", default=defaults.date)
+    parser.add_argument("--amount-column", default=defaults.amount)
+    parser.add_argument("--reference-column", help="order or transaction id column to list on statements")
+    args = parser.parse_args(argv)
+
+    columns = SalesColumns(args.client_column, args.date_column, args.amount_column, args.reference_column)
+    store = AgreementStore(args.store_dir)
+
+    if args.summary:
+        totals = aggregate(args.input, columns)
+        if args.out:
+            with open(args.out, "w", newline="") as f:
+                write_summary(totals, store, args.rate, f)
+        else:
+            write_summary(totals, store, args.rate)
+        return 0
+
+    if not (args.client and args.month and args.out):
+        parser.error("a statement needs --client, --month and --out (or use --summary)")
+    try:
+        date.fromisoformat(f"{args.month}-01")
+    except ValueError:
+        parser.error("--month must be YYYY-MM")
+    rate, agreement = agreement_rate(store, args.client, args.month, args.agreement)
+    if args.rate is not None:
+        rate, agreement = args.rate, None
+    if rate is None:
+        print(f"{args.client}: no agreement in force for {args.month}; pass --rate or --agreement",
+              file=sys.stderr)
+        return 1
+    figures = build_statement(args.out, args.input, args.client, args.month, rate, columns, agreement)
+    print(f"{args.out}: {figures['transactions']} transactions, gross {money(figures['gross'])}, "
+          f"commission {money(figures['commission'])} at {rate * 100:g}%, {figures['pages']} pages", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Size reduction and size accounting for generated PDFs.
+
+``linearize`` rewrites a PDF for fast web view when pikepdf is installed and
+returns it unchanged otherwise. ``size_report`` splits a PDF's bytes into
+text (page content streams), images, fonts and everything else.
+"""
+import io
+import logging
+import re
+
+logger = logging.getLogger("agreement.pdf")
+
+# signatures print at 3in x 0.75in; 200 dpi keeps a pen stroke smooth on paper
+PRINT_DPI = 200
+
+_OBJECT_RE = re.compile(rb"\d+ \d+ obj\b(.*?)endobj", re.S)
+_FONT_MARKERS = (b"/Type /Font", b"/FontDescriptor", b"/FontFile")
+
+
+def linearize(pdf_data):
+    try:
+        import pikepdf
+    except ImportError:
+        return pdf_data
+    with pikepdf.open(io.BytesIO(pdf_data)) as pdf:
+        out = io.BytesIO()
+        # deterministic_id keeps equal inputs byte-identical, as invariant mode does
+        pdf.save(out, linearize=True, compress_streams=True, deterministic_id=True)
+    return out.getvalue()
+
+
+def size_report(pdf_data):
+    """Bytes per part: ``{"total", "text", "images", "fonts", "other"}``."""
+    report = {"total": len(pdf_data), "text": 0, "images": 0, "fonts": 0}
+    for match in _OBJECT_RE.finditer(pdf_data):
+        # classify by the dictionary only; stream data is binary
+        header, has_stream, _ = match.group(1).partition(b"stream")
+        size = match.end() - match.start()
+        if b"/Subtype /Image" in header:
+            report["images"] += size
+        elif any(marker in header for marker in _FONT_MARKERS):
+            report["fonts"] += size
+        elif has_stream:
+            report["text"] += size
+    report["other"] = report["total"] - report["text"] - report["images"] - report["fonts"]
+    return report
+
+
+def log_size_report(report, budget=None, name="agreement"):
+    """Log ``report``; returns False (with a warning) when it exceeds ``budget`` bytes."""
+    logger.info("PDF %s: %d bytes (text %d, images %d, fonts %d, other %d)", name, report["total"],
+                report["text"], report["images"], report["fonts"], report["other"])
+    if budget and report["total"] > budget:
+        logger.warning("PDF %s is %d bytes, over the %d byte budget", name, report["total"], budget)
+        return False
+    return True
@@ -0,0 +1,135 @@
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SmtpSettings(NamedTuple):
+    server: str
+    port: int
+    sender: str
+    password: Optional[str] = None
+    use_tls: bool = True
+    admin_email: Optional[str] = None
+
+
+class AppConfig(NamedTuple):
+    # None when the email secrets are missing; the PDF download still works
+    smtp: Optional[SmtpSettings]
+    # "vector" draws signatures as paths, "raster" embeds a cropped 1-bit image
+    signature_mode: str = "vector"
+    # PDF worker processes; None means one per CPU
+    render_workers: Optional[int] = None
+    # root of the signed-agreement store (SQLite metadata + PDF blobs)
+    store_dir: str = "agreement_store"
+    # per-stage timing histograms; off means no recording at all
+    metrics: bool = True
+    # also log every observation as one JSON line
+    metrics_json_logs: bool = False
+    # port for the /metrics endpoint; None means not served
+    metrics_port: Optional[int] = None
+    # smaller PDFs: trimmed signatures, raw Flate streams, linearized with pikepdf
+    compact_pdf: bool = False
+    # PDFs above this many bytes are logged as over budget; None means no limit
+    pdf_size_budget: Optional[int] = None
+    # generated PDFs kept in memory across all sessions; the rest is served from disk
+    artifact_memory_mb: int = 64
+    # sessions without a download or generate for this long are spilled first
+    artifact_idle_seconds: int = 300
+    # "strokes" sends only new strokes from the browser; "pixels" uses
+    # streamlit-drawable-canvas, which sends the whole image on every stroke
+    canvas_transport: str = "strokes"
+    # unlocks the past-agreements lookup in the sidebar; None hides it
+    admin_password: Optional[str] = None
+    # bearer token the HTTP API (api.py) requires on its agreement and mail routes
+    api_token: Optional[str] = None
+
+
+def _strict_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "false", "1", "0"):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError("expected true or false")
+
+
+def _int_or_none(value):
+    # 0 means "not set" for these settings
+    if isinstance(value, bool) or int(value) < 0:
+        raise ValueError("expected a non-negative integer")
+    return int(value) or None
+
+
+def _positive_int(value):
+    if isinstance(value, bool) or int(value) <= 0:
+        raise ValueError("expected a positive integer")
+    return int(value)
+
+
+def _one_of(*choices):
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}")
+        return value
+    return parse
+
+
+def _setting(section, name, parse, default, prefix=""):
+    """``parse`` applied to ``section[name]``; the default when it is missing or invalid.
+
+    Each setting falls back on its own, so one typo does not reset the rest.
+    """
+    value = section.get(name)
+    if value is None:
+        return default
+    try:
+        return parse(value)
+    except (TypeError, ValueError) as e:
+        logger.warning("Invalid %s%s setting %r (%s); using %r", prefix, name, value, e, default)
+        return default
+
+
+def parse_config(secrets):
+    """Build an ``AppConfig`` from a Streamlit secrets mapping (or a plain dict)."""
+    try:
+        secrets = dict(secrets)
+    except FileNotFoundError:
+        # st.secrets without a secrets file: every setting takes its default
+        secrets = {}
+
+    try:
+        email_secrets = secrets["email"]
+        smtp = SmtpSettings(
+            server=email_secrets["smtp_server"],
+            port=int(email_secrets["port"]),
+            sender=email_secrets["sender_email"],
+            password=email_secrets.get("password"),
+            use_tls=_setting(email_secrets, "use_tls", _strict_bool, True, "email."),
+            admin_email=email_secrets.get("admin_email", None),
+        )
+    except Exception:
+        smtp = None
+
+    metrics_secrets = secrets.get("metrics", {})
+    if not hasattr(metrics_secrets, "get"):
+        logger.warning("Invalid metrics setting %r (expected a table); using the defaults", metrics_secrets)
+        metrics_secrets = {}
+
+    return AppConfig(
+        smtp,
+        signature_mode=_setting(secrets, "signature_mode", _one_of("vector", "raster"), "vector"),
+        render_workers=_setting(secrets, "render_workers", _int_or_none, None),
+        store_dir=_setting(secrets, "store_dir", str, "agreement_store"),
+        metrics=_setting(metrics_secrets, "enabled", _strict_bool, True, "metrics."),
+        metrics_json_logs=_setting(metrics_secrets, "json_logs", _strict_bool, False, "metrics."),
+        metrics_port=_setting(metrics_secrets, "port", _int_or_none, None, "metrics."),
+        compact_pdf=_setting(secrets, "compact_pdf", _strict_bool, False),
+        pdf_size_budget=_setting(secrets, "pdf_size_budget", _int_or_none, None),
+        artifact_memory_mb=_setting(secrets, "artifact_memory_mb", _positive_int, 64),
+        artifact_idle_seconds=_setting(secrets, "artifact_idle_seconds", _positive_int, 300),
+        canvas_transport=_setting(secrets, "canvas_transport", _one_of("strokes", "pixels"), "strokes"),
+        admin_password=_setting(secrets, "admin_password", lambda value: str(value) or None, None),
+        api_token=_setting(secrets, "api_token", lambda value: str(value) or None, None),
+    )
@@ -0,0 +1,284 @@
+"""Concurrent-session load test for app.py.
+
+Drives N headless sessions at once through Streamlit's app-testing API:
+accept the terms, fill the form, sign both pads with synthetic strokes,
+generate and wait for the emails to reach a local SMTP stand-in. Reports
+p50/p95/p99 latency of every script rerun, of Generate (click to download
+ready) and of email delivery, plus the peak resident memory of the server
+process and its render workers, for each concurrency level:
+
+    python loadtest.py --sessions 1 4 16 --out load.json
+
+AppTest swaps process-global state (the runtime, st.secrets) on every run,
+so script runs from different sessions take turns on a lock; rendering and
+email delivery still overlap across sessions. Rerun latency includes the
+wait for that lock, which is how one GIL-bound Streamlit server shares its
+CPU between sessions as well. One unreported session runs first to start
+the render pool and the mail queue.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from benchmark import _commit, sample_signature
+from local_smtp import LocalSMTPServer
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SIGNATURE_VARIANTS = 16
+
+_run_lock = threading.Lock()
+
+
+# -----------------------------
+# Synthetic canvas
+# -----------------------------
+_signatures = {}
+
+
+def synthetic_signature(client_name, pad, width=700, height=180):
+    """A scribble chosen by session and pad, from a small shared set."""
+    seed = zlib.crc32(f"{client_name}/{pad}".encode()) % SIGNATURE_VARIANTS
+    signature = _signatures.get(seed)
+    if signature is None:
+        signature = _signatures[seed] = sample_signature(width, height, seed=seed)
+    return signature
+
+
+def fake_canvas(**kwargs):
+    """Stand-in for ``st_canvas`` (the "pixels" transport)."""
+    import streamlit as st
+    from streamlit_drawable_canvas import CanvasResult
+
+    signature = synthetic_signature(st.session_state.get("client_name"), kwargs.get("key"),
+                                    kwargs.get("width", 700), kwargs.get("height", 180))
+    return CanvasResult(signature.image_data, {"objects": list(signature.strokes)})
+
+
+# -----------------------------
+# Memory
+# -----------------------------
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler:
+    """Peak RSS of this process plus its live child processes (Linux /proc)."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        pids = [os.getpid()] + [p.pid for p in multiprocessing.active_children()]
+        self.peak = max(self.peak, sum(_rss_bytes(pid) for pid in pids))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.peak = 0
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        if not self.peak:
+            # no /proc: fall back to this process's lifetime high-water mark
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# -----------------------------
+# One session
+# -----------------------------
+class SessionResult:
+    def __init__(self):
+        self.reruns = []
+        self.generate = None
+        self.email = None
+        self.error = None
+
+
+def run_session(name, secrets, timeout, poll_interval, start_barrier):
+    from streamlit.testing.v1 import AppTest
+
+    result = SessionResult()
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    for key, value in secrets.items():
+        at.secrets[key] = value
+
+    def rerun(action):
+        started = time.perf_counter()
+        with _run_lock:
+            action().run()
+        result.reruns.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    try:
+        start_barrier.wait()
+        rerun(lambda: at)
+        rerun(lambda: at.checkbox[0].check())
+        at.main.text_input[0].input(name)
+        at.main.text_input[1].input("Load Tester")
+        at.main.text_input[2].input("client@example.com")
+        at.main.text_input[4].input("rep@example.com")
+        at.main.text_input[-1].input("Delaware")
+        rerun(lambda: at)
+        if secrets["canvas_transport"] == "strokes":
+            # what the stroke-only pads hold once the browser has sent every stroke
+            for pad in ("client", "agency"):
+                at.session_state[f"{pad}_sig_strokes"] = list(synthetic_signature(name, pad).strokes)
+
+        clicked = time.perf_counter()
+        rerun(lambda: next(b for b in at.button if "Generate" in b.label).click())
+        deadline = clicked + timeout
+        while time.perf_counter() < deadline:
+            if result.generate is None and any("Signed agreement created" in s.value or "already generated" in s.value
+                                               for s in at.success):
+                result.generate = time.perf_counter() - clicked
+            if any("emailed" in i.value for i in at.info):
+                result.email = time.perf_counter() - clicked
+                break
+            if any("failed" in w.value for w in at.warning) or at.error:
+                raise RuntimeError("; ".join(e.value for e in list(at.warning) + list(at.error)))
+            time.sleep(poll_interval)
+            rerun(lambda: at)
+        else:
+            raise TimeoutError(f"no email {timeout:.0f}s after Generate")
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+# -----------------------------
+# Levels
+# -----------------------------
+def percentiles(samples):
+    ms = sorted(s * 1000 for s in samples)
+    if not ms:
+        return {"n": 0}
+
+    def rank(q):
+        return ms[min(len(ms) - 1, max(0, int(round(q * len(ms))) - 1))]
+    return {"n": len(ms), "p50_ms": rank(0.50), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": ms[-1]}
+
+
+def run_level(sessions, secrets, server, timeout, poll_interval, run_id):
+    results = [None] * sessions
+    barrier = threading.Barrier(sessions)
+
+    def worker(i):
+        results[i] = run_session(f"Load Client {run_id}-{sessions}-{i}", secrets, timeout, poll_interval, barrier)
+
+    messages_before = server.messages
+    started = time.perf_counter()
+    with MemorySampler() as memory:
+        threads = [threading.Thread(target=worker, args=(i,), name=f"session-{i}") for i in range(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    errors = [r.error for r in results if r.error]
+    return {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "rerun": percentiles([s for r in results for s in r.reruns]),
+        "generate": percentiles([r.generate for r in results if r.generate is not None]),
+        "email": percentiles([r.email for r in results if r.email is not None]),
+        "emails_received": server.messages - messages_before,
+        "peak_rss_mb": memory.peak / 1e6,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+    }
+
+
+def run(levels, render_workers=None, timeout=120.0, poll_interval=0.1, transport="strokes"):
+    if transport == "pixels":
+        import streamlit_drawable_canvas
+
+        # app.py imports st_canvas inside the signature step, so patching the
+        # module attribute reaches every session
+        streamlit_drawable_canvas.st_canvas = fake_canvas
+    run_id = datetime.now().strftime("%H%M%S")
+    reports = []
+    with tempfile.TemporaryDirectory() as store_dir, LocalSMTPServer() as server:
+        secrets = {
+            "email": {"smtp_server": "127.0.0.1", "port": server.port, "sender_email": "agency@example.com",
+                      "use_tls": False, "admin_email": "admin@example.com"},
+            "store_dir": store_dir,
+            "render_workers": render_workers or 0,
+            "canvas_transport": transport,
+        }
+        run_level(1, secrets, server, timeout, poll_interval, f"{run_id}-warmup")
+        for sessions in levels:
+            report = run_level(sessions, secrets, server, timeout, poll_interval, run_id)
+            print(f"{sessions:>4} sessions  "
+                  f"rerun p50/p95/p99 {report['rerun'].get('p50_ms', 0):7.1f}/{report['rerun'].get('p95_ms', 0):7.1f}/"
+                  f"{report['rerun'].get('p99_ms', 0):7.1f} ms  "
+                  f"generate p50/p95/p99 {report['generate'].get('p50_ms', 0):7.1f}/"
+                  f"{report['generate'].get('p95_ms', 0):7.1f}/{report['generate'].get('p99_ms', 0):7.1f} ms  "
+                  f"peak {report['peak_rss_mb']:7.1f} MB  errors {report['errors']}", file=sys.stderr)
+            reports.append(report)
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app.py with concurrent headless sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="concurrency levels to run, in order")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="PDF worker processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds a session may take after Generate")
+    parser.add_argument("--poll-interval", type=float, default=0.1,
+                        help="seconds between reruns while waiting for the PDF and the emails")
+    parser.add_argument("--transport", choices=("strokes", "pixels"), default="strokes",
+                        help="signature pad transport to configure the app with")
+    parser.add_argument("--out", help="write results as JSON to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": _commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "transport": args.transport,
+        "levels": run(args.sessions, args.render_workers, args.timeout, args.poll_interval, args.transport),
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if any(level["errors"] for level in report["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
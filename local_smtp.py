@@ -0,0 +1,84 @@
+"""In-process SMTP stand-in for benchmarks and load tests.
+
+Speaks just enough SMTP (no TLS, no AUTH) for ``smtplib`` and ``mailer`` to
+deliver messages; received messages are counted, not stored.
+
+    with LocalSMTPServer() as server:
+        settings = SmtpSettings("127.0.0.1", server.port, "agency@example.com", use_tls=False)
+"""
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        self._reply("220 localhost ESMTP stand-in")
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self._reply("250 localhost")
+            elif command == b"MAIL":
+                recipients = 0
+                self._reply("250 OK")
+            elif command == b"RCPT":
+                recipients += 1
+                self._reply("250 OK")
+            elif command == b"DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    size += len(data_line)
+                with server.lock:
+                    server.messages += 1
+                    server.recipients += recipients
+                    server.bytes_received += size
+                self._reply("250 OK")
+            elif command in (b"RSET", b"NOOP"):
+                self._reply("250 OK")
+            elif command == b"QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.recipients = 0
+        self.bytes_received = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="local-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,277 @@
+import heapq
+import itertools
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.base import MIMEBase
+from email import encoders
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------
+# Message assembly
+# -----------------------------
+def attachment_part(pdf_data, pdf_filename):
+    """Base64-encode the PDF once; the part is shared by every recipient's message."""
+    part = MIMEBase('application', 'octet-stream')
+    part.set_payload(pdf_data)
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', f'attachment; filename={pdf_filename}')
+    return part
+
+
+def agreement_recipients(details, admin_email=None, skip=()):
+    """(email, name, role) of everyone who gets a copy of the signed agreement.
+
+    Addresses in ``skip`` (lowercase) are left out, e.g. those already emailed.
+    """
+    recipients = [(details["client_email"], details["client_rep_name"], "Client Representative")]
+    if details["agency_email"]:
+        recipients.append((details["agency_email"], details["agency_rep_name"], "Agency Representative"))
+    # admin copy
+    if admin_email:
+        recipients.append((admin_email, "Admin", "Admin Copy"))
+    return [r for r in recipients if r[0].lower() not in skip]
+
+
+def agreement_message(sender, recipient_email, recipient_name, role, attachment, signed_at):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = recipient_email
+    msg['Subject'] = f"Signed Ad Manager Agreement - The ATM Agency - {recipient_name}"
+    body = f"""Dear {recipient_name},
+
+Please find attached the signed Ad Manager & Partnership Agreement between The ATM Agency and {recipient_name}.
+
+Role: {role}
+Date Signed: {signed_at.strftime('%B %d, %Y at %I:%M %p')}
+
+If you have any questions, reply to this email.
+
+Regards,
+The ATM Agency
+"""
+    msg.attach(MIMEText(body, 'plain'))
+    msg.attach(attachment)
+    return msg
+
+
+# -----------------------------
+# Persistent SMTP session
+# -----------------------------
+class SmtpSession:
+    """One SMTP connection kept open across messages and reopened on demand."""
+
+    def __init__(self, settings, timeout=30):
+        self.settings = settings
+        self.timeout = timeout
+        self._server = None
+
+    def _connect(self):
+        with metrics.timed(metrics.SMTP_SECONDS, "connect"):
+            server = smtplib.SMTP(self.settings.server, int(self.settings.port), timeout=self.timeout)
+        if self.settings.use_tls:
+            with metrics.timed(metrics.SMTP_SECONDS, "starttls"):
+                server.starttls()
+        if self.settings.password:
+            with metrics.timed(metrics.SMTP_SECONDS, "login"):
+                server.login(self.settings.sender, self.settings.password)
+        self._server = server
+
+    def send(self, msg):
+        if self._server is None:
+            self._connect()
+        try:
+            with metrics.timed(metrics.SMTP_SECONDS, "send"):
+                self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped an idle connection; reconnect once
+            self._server = None
+            self._connect()
+            self._server.send_message(msg)
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+# -----------------------------
+# Background queue
+# -----------------------------
+class MailJob:
+    """Delivery of one agreement to all of its recipients."""
+
+    def __init__(self, job_id, recipients, pdf_data, pdf_filename, on_done=None):
+        self.id = job_id
+        # (email, name, role) triples
+        self.recipients = list(recipients)
+        self.pdf_data = pdf_data
+        self.pdf_filename = pdf_filename
+        self.created = datetime.now()
+        self.status = "queued"
+        self.attempts = 0
+        self.results = {email: "pending" for email, _, _ in self.recipients}
+        self.error = None
+        # recipients the server refused with a permanent (5xx) error; never retried
+        self.rejected = set()
+        self.attachment = None
+        self.done = threading.Event()
+        # called with the job from the worker thread once delivery has finished
+        self.on_done = on_done
+
+    def pending(self):
+        return [r for r in self.recipients if self.results[r[0]] != "sent"]
+
+    def retryable(self):
+        return [r for r in self.pending() if r[0] not in self.rejected]
+
+    def settled(self):
+        """Addresses that got the agreement or refused it for good."""
+        return [email for email, result in self.results.items() if result == "sent" or email in self.rejected]
+
+
+def is_permanent_failure(error):
+    """True for SMTP replies that will not change on retry (5xx)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class MailQueue:
+    """Bounded outbound queue served by one worker thread and one SMTP session.
+
+    Recipients that fail transiently are retried with exponential backoff while
+    other jobs keep flowing; permanent (5xx) rejections are not retried. The
+    session is closed after ``idle_timeout`` seconds without work.
+    """
+
+    def __init__(self, settings, maxsize=100, max_attempts=3, backoff=2.0,
+                 idle_timeout=60, history=500):
+        self.settings = settings
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.history = history
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        # (not_before, seq, job) of jobs waiting for their next attempt; worker thread only
+        self._retries = []
+        self._retry_seq = itertools.count()
+        self._lock = threading.Lock()
+        self._session = SmtpSession(settings)
+        self._worker = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+        self._worker.start()
+
+    def submit(self, recipients, pdf_data, pdf_filename, on_done=None):
+        """Enqueue a job and return it immediately; raises ``queue.Full`` when saturated.
+
+        ``on_done(job)`` runs on the worker thread after the job's final status is set.
+        """
+        with self._lock:
+            job = MailJob(next(self._ids), recipients, pdf_data, pdf_filename, on_done)
+        self._queue.put_nowait(job)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _run(self):
+        while True:
+            if self._retries and self._retries[0][0] <= time.monotonic():
+                _, _, job = heapq.heappop(self._retries)
+                self._attempt(job)
+                continue
+            timeout = self.idle_timeout
+            if self._retries:
+                timeout = min(timeout, self._retries[0][0] - time.monotonic())
+            try:
+                job = self._queue.get(timeout=max(timeout, 0))
+            except queue.Empty:
+                if not self._retries:
+                    self._session.close()
+                continue
+            if job is None:
+                # shutting down: jobs still waiting for a retry end with what they have
+                while self._retries:
+                    self._finish(heapq.heappop(self._retries)[2])
+                self._session.close()
+                return
+            self._deliver(job)
+
+    def _deliver(self, job):
+        metrics.observe(metrics.STAGE_SECONDS, "mail_queue_wait", (datetime.now() - job.created).total_seconds())
+        job.status = "sending"
+        with metrics.timed(metrics.STAGE_SECONDS, "mime_assembly"):
+            job.attachment = attachment_part(job.pdf_data, job.pdf_filename)
+        self._attempt(job)
+
+    def _attempt(self, job):
+        job.attempts += 1
+        job.status = "sending"
+        for email, name, role in job.retryable():
+            msg = agreement_message(self.settings.sender, email, name, role, job.attachment, job.created)
+            try:
+                self._session.send(msg)
+                job.results[email] = "sent"
+            except Exception as e:
+                logger.warning("Mail job %s: sending to %s failed (attempt %s): %s", job.id, email, job.attempts, e)
+                job.results[email] = f"failed: {e}"
+                job.error = str(e)
+                if is_permanent_failure(e):
+                    # the server answered and will answer the same way again
+                    job.rejected.add(email)
+                else:
+                    self._session.close()
+        if job.retryable() and job.attempts < self.max_attempts:
+            # wait in the retry heap instead of sleeping, so other jobs are not held up
+            job.status = "retrying"
+            not_before = time.monotonic() + self.backoff * 2 ** (job.attempts - 1)
+            heapq.heappush(self._retries, (not_before, next(self._retry_seq), job))
+        else:
+            self._finish(job)
+
+    def _finish(self, job):
+        metrics.observe(metrics.STAGE_SECONDS, "mail_delivery", (datetime.now() - job.created).total_seconds())
+        # finished jobs stay in the history for status lookups; the PDF is not needed there
+        job.pdf_data = None
+        job.attachment = None
+
+        if not job.pending():
+            job.status = "sent"
+        elif len(job.pending()) < len(job.recipients):
+            job.status = "partial"
+        else:
+            job.status = "failed"
+        job.done.set()
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception:
+                logger.exception("Mail job %s: completion callback failed", job.id)
@@ -0,0 +1,181 @@
+"""In-process histograms for the generate flow.
+
+Observations are recorded only after ``configure(enabled=True)``; while
+disabled every call returns after a single flag check. Export with
+``prometheus_text()``, ``serve(port)`` (a ``/metrics`` endpoint) or as one JSON
+log line per observation (``configure(..., json_logs=True)``).
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger("agreement.metrics")
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1_000, 4_000, 16_000, 64_000, 256_000, 1_000_000, 4_000_000, 16_000_000)
+
+_enabled = False
+_json_logs = False
+
+
+class Histogram:
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label value -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {label: list(series) for label, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def prometheus_lines(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.snapshot().items()):
+            labels = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("agreement_stage_seconds", "Time spent in each stage of the generate flow.",
+                          "stage", TIME_BUCKETS)
+SMTP_SECONDS = Histogram("agreement_smtp_seconds", "SMTP round-trip time per protocol phase.",
+                         "phase", TIME_BUCKETS)
+PAYLOAD_BYTES = Histogram("agreement_payload_bytes", "Size of generated PDFs and signature payloads.",
+                          "kind", SIZE_BUCKETS)
+HISTOGRAMS = (STAGE_SECONDS, SMTP_SECONDS, PAYLOAD_BYTES)
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def configure(enabled=True, json_logs=False):
+    global _enabled, _json_logs
+    _enabled = enabled
+    _json_logs = enabled and json_logs
+
+
+def enabled():
+    return _enabled
+
+
+def observe(histogram, label_value, value):
+    if not _enabled:
+        return
+    histogram.observe(label_value, value)
+    if _json_logs:
+        logger.info(json.dumps({"metric": histogram.name, histogram.label: label_value, "value": value}))
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_value", "started")
+
+    def __init__(self, histogram, label_value):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.histogram, self.label_value, time.perf_counter() - self.started)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(histogram, label_value):
+    """Context manager that records the block's wall time into ``histogram``."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(histogram, label_value)
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def prometheus_text():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.prometheus_lines())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """All series as plain data: ``{metric: {label: {"buckets", "count", "sum"}}}``."""
+    result = {}
+    for histogram in HISTOGRAMS:
+        result[histogram.name] = {
+            label: {
+                "buckets": dict(zip([str(b) for b in histogram.buckets] + ["+Inf"], series[:-1])),
+                "count": sum(series[:-1]),
+                "sum": series[-1],
+            }
+            for label, series in histogram.snapshot().items()
+        }
+    return result
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve ``/metrics`` (Prometheus text) and ``/metrics.json`` on a daemon thread."""
+    # imported here: http.server pulls in the email package, which the page
+    # otherwise only loads when the first agreement is emailed
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(snapshot()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,139 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from compact_pdf import log_size_report, size_report
+from signatures import Signature
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+def warm_worker():
+    # load ReportLab, the standard fonts and the cached stylesheet/clauses
+    # before the first contract arrives
+    from reportlab.pdfbase import pdfmetrics
+    from agreement_pdf import get_agreement_layout
+    from templates import TEMPLATES
+
+    for font in ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Times-Roman"):
+        pdfmetrics.getFont(font)
+    for template_id in TEMPLATES:
+        get_agreement_layout(template_id)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render(details, client_signature, agency_signature, signature_mode, signed_on, compact):
+    from agreement_pdf import build_agreement_pdf
+
+    started = time.perf_counter()
+    pdf = build_agreement_pdf(details, client_signature, agency_signature, signature_mode, signed_on, compact)
+    # the worker's own clock; the parent records it, since workers keep no metrics
+    return pdf, time.perf_counter() - started
+
+
+def _payload(signature, signature_mode):
+    # vector signatures only need the strokes; don't pickle the pixel array
+    if signature_mode == "vector" and signature.strokes:
+        return Signature(signature.strokes)
+    return signature
+
+
+# -----------------------------
+# Pool
+# -----------------------------
+class RenderPool:
+    """Process pool of warm ReportLab workers for building agreement PDFs.
+
+    ``submit`` returns a ``concurrent.futures.Future`` whose result is the PDF
+    bytes; callers poll ``done()`` instead of blocking on it. Every finished
+    PDF's size breakdown is logged and checked against ``size_budget``.
+    If a worker dies (e.g. OOM-killed), the broken executor is replaced and
+    the affected render is submitted once more.
+    """
+
+    def __init__(self, max_workers=None, size_budget=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.size_budget = size_budget
+        self._lock = threading.Lock()
+        self._executor = self._start_executor()
+
+    def _start_executor(self):
+        # spawn rather than fork: the Streamlit server process is multi-threaded
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_worker,
+        )
+        for _ in range(self.max_workers):
+            executor.submit(_ping)
+        return executor
+
+    def _restart(self, broken):
+        with self._lock:
+            # several renders notice the same broken pool; only the first replaces it
+            if self._executor is broken:
+                logger.warning("Render pool broken (a worker died); starting a new one")
+                broken.shutdown(wait=False)
+                self._executor = self._start_executor()
+
+    def _submit(self, *args):
+        executor = self._executor
+        try:
+            return executor, executor.submit(_render, *args)
+        except BrokenProcessPool:
+            self._restart(executor)
+            executor = self._executor
+            return executor, executor.submit(_render, *args)
+
+    def submit(self, details, client_signature, agency_signature, signature_mode="vector", signed_on=None,
+               compact=False):
+        submitted = time.perf_counter()
+        args = (dict(details), _payload(client_signature, signature_mode), _payload(agency_signature, signature_mode),
+                signature_mode, signed_on, compact)
+        executor, inner = self._submit(*args)
+        result = Future()
+
+        def unwrap(done, executor=executor, retry=True):
+            try:
+                pdf, build_seconds = done.result()
+            except BrokenProcessPool as e:
+                if not retry:
+                    result.set_exception(e)
+                    return
+                # the worker running this (or another) render died; try once on a fresh pool
+                self._restart(executor)
+                try:
+                    executor, again = self._submit(*args)
+                except BaseException as e:
+                    result.set_exception(e)
+                    return
+                again.add_done_callback(lambda done: unwrap(done, executor, retry=False))
+                return
+            except BaseException as e:
+                result.set_exception(e)
+                return
+            metrics.observe(metrics.STAGE_SECONDS, "pdf_build", build_seconds)
+            metrics.observe(metrics.STAGE_SECONDS, "render_total", time.perf_counter() - submitted)
+            report = size_report(pdf)
+            for part in ("total", "text", "images", "fonts"):
+                metrics.observe(metrics.PAYLOAD_BYTES, "pdf" if part == "total" else f"pdf_{part}", report[part])
+            log_size_report(report, self.size_budget, details.get("client_name", "agreement"))
+            result.set_result(pdf)
+
+        inner.add_done_callback(unwrap)
+        return result
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._executor.shutdown(wait=wait)
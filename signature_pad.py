@@ -0,0 +1,123 @@
+"""Signature pad that sends strokes, not pixels.
+
+The browser draws locally and sends each finished stroke (integer points)
+as a trigger value; strokes the server has not acknowledged yet are resent
+with the next one, so none are lost when reruns overlap. The stroke list is
+kept in session state and rasterized or vectorized only on Generate.
+"""
+import streamlit as st
+
+from strokes import MAX_STROKES, PAD_HEIGHT, PAD_WIDTH, STROKE_WIDTH, clean_path, stroke_object
+
+_HTML = '<canvas class="signature-pad"></canvas>'
+
+_CSS = """
+.signature-pad {
+    width: 100%;
+    max-width: 700px;
+    aspect-ratio: 700 / 180;
+    background: #ffffff;
+    border: 1px solid #cbd5e1;
+    border-radius: 4px;
+    touch-action: none;
+    cursor: crosshair;
+}
+"""
+
+_JS = """
+export default function (component) {
+    const { data, parentElement, setTriggerValue } = component;
+    const canvas = parentElement.querySelector("canvas");
+    const ctx = canvas.getContext("2d");
+    let pad = canvas.__pad;
+    const mounted = !pad;
+    if (mounted || pad.epoch !== data.epoch) {
+        canvas.width = data.width;
+        canvas.height = data.height;
+        pad = canvas.__pad = { epoch: data.epoch, next: mounted ? 0 : data.acked, pending: [], current: null };
+        if (mounted && data.acked > 0) {
+            // a fresh pad cannot show strokes the server still holds; the
+            // server drops them and starts a new epoch
+            setTriggerValue("strokes", { epoch: data.epoch, reset: true, strokes: [] });
+        }
+    }
+    pad.pending = pad.pending.filter((stroke) => stroke.seq >= data.acked);
+    ctx.lineWidth = data.stroke_width;
+    ctx.lineCap = "round";
+    ctx.lineJoin = "round";
+    ctx.strokeStyle = "#000000";
+
+    const point = (e) => {
+        const rect = canvas.getBoundingClientRect();
+        return [Math.round((e.clientX - rect.left) * canvas.width / rect.width),
+                Math.round((e.clientY - rect.top) * canvas.height / rect.height)];
+    };
+    canvas.onpointerdown = (e) => {
+        canvas.setPointerCapture(e.pointerId);
+        const [x, y] = point(e);
+        pad.current = [["M", x, y]];
+        pad.last = [x, y];
+        ctx.beginPath();
+        ctx.moveTo(x, y);
+    };
+    canvas.onpointermove = (e) => {
+        if (!pad.current) return;
+        const [x, y] = point(e);
+        if (Math.abs(x - pad.last[0]) + Math.abs(y - pad.last[1]) < 2) return;
+        pad.current.push(["L", x, y]);
+        pad.last = [x, y];
+        ctx.lineTo(x, y);
+        ctx.stroke();
+    };
+    canvas.onpointerup = canvas.onpointercancel = () => {
+        if (!pad.current) return;
+        if (pad.current.length === 1) {
+            // a tap: a dot
+            pad.current.push(["L", pad.last[0], pad.last[1]]);
+            ctx.lineTo(pad.last[0], pad.last[1]);
+            ctx.stroke();
+        }
+        pad.pending.push({ seq: pad.next++, path: pad.current });
+        pad.current = null;
+        setTriggerValue("strokes", { epoch: pad.epoch, strokes: pad.pending });
+    };
+}
+"""
+
+_signature_pad = st.components.v2.component("signature_pad", html=_HTML, css=_CSS, js=_JS)
+
+
+def signature_pad(key, width=PAD_WIDTH, height=PAD_HEIGHT):
+    """Show a pad and return its strokes as fabric.js-style path objects."""
+    strokes = st.session_state.setdefault(f"{key}_strokes", [])
+    epoch = st.session_state.setdefault(f"{key}_epoch", 0)
+    # sequence number of the next stroke expected from the browser
+    seq = st.session_state.setdefault(f"{key}_seq", 0)
+    result = _signature_pad(
+        key=key,
+        data={"width": width, "height": height, "stroke_width": STROKE_WIDTH, "epoch": epoch, "acked": seq},
+        on_strokes_change=lambda: None,
+    )
+    update = result.strokes
+    if isinstance(update, dict) and update.get("epoch") == epoch:
+        if update.get("reset"):
+            clear_signature_pad(key)
+            return st.session_state[f"{key}_strokes"]
+        for stroke in update.get("strokes") or ():
+            # resent strokes are skipped; a gap means one was lost, so wait for the resend
+            if not isinstance(stroke, dict) or stroke.get("seq") != seq:
+                continue
+            seq += 1
+            path = clean_path(stroke.get("path") or [], width, height)
+            # bounds what one browser can make the server hold
+            if path is not None and len(strokes) < MAX_STROKES:
+                strokes.append(stroke_object(path))
+        st.session_state[f"{key}_seq"] = seq
+    return strokes
+
+
+def clear_signature_pad(key):
+    st.session_state[f"{key}_strokes"] = []
+    st.session_state[f"{key}_seq"] = 0
+    # a new epoch makes the browser wipe its canvas and ignore stale strokes
+    st.session_state[f"{key}_epoch"] = st.session_state.get(f"{key}_epoch", 0) + 1
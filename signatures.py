@@ -0,0 +1,267 @@
+import hashlib
+import io
+import json
+
+import numpy as np
+from PIL import Image, ImageDraw
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, Spacer, Image as RLImage
+
+from compact_pdf import PRINT_DPI
+
+SIGNATURE_WIDTH = 3*inch
+SIGNATURE_HEIGHT = 0.75*inch
+
+# "vector" draws the canvas strokes as PDF paths, "raster" embeds a cropped
+# 1-bit image of the ink
+SIGNATURE_MODES = ("vector", "raster")
+
+
+# -----------------------------
+# Canvas data
+# -----------------------------
+class Signature:
+    """Signature captured on an ``st_canvas`` pad or a stroke-only pad.
+
+    ``strokes`` are fabric.js freedraw path objects; ``image_data`` is the RGBA
+    pixel array for the raster fallback. A stroke-only signature knows its pad
+    size and rasterizes its strokes the first time pixels are needed.
+    """
+
+    def __init__(self, strokes=(), image_data=None, canvas_size=None):
+        self.strokes = tuple(strokes)
+        self._image_data = image_data
+        # (width, height) of the pad the strokes were drawn on
+        self.canvas_size = canvas_size
+
+    @property
+    def image_data(self):
+        if self._image_data is None and self.strokes and self.canvas_size:
+            self._image_data = rasterize_strokes(self.strokes, *self.canvas_size)
+        return self._image_data
+
+    @classmethod
+    def from_canvas(cls, canvas_result):
+        json_data = canvas_result.json_data or {}
+        strokes = [obj for obj in json_data.get("objects", []) if obj.get("type") == "path"]
+        return cls(strokes, canvas_result.image_data)
+
+    @classmethod
+    def from_strokes(cls, strokes, width, height):
+        return cls(strokes, canvas_size=(width, height))
+
+    @classmethod
+    def from_image_file(cls, path, threshold=128):
+        """Load a pre-captured signature image (e.g. a scanned PNG) from a path or file object."""
+        img = Image.open(path)
+        if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+            rgba = np.asarray(img.convert("RGBA"))
+            if (rgba[..., 3] < 255).any():
+                return cls(image_data=rgba)
+        # opaque scan: treat dark pixels as ink on a transparent background
+        gray = np.asarray(img.convert("L"))
+        rgba = np.zeros(gray.shape + (4,), dtype=np.uint8)
+        rgba[..., 3] = np.where(gray < threshold, 255, 0)
+        return cls(image_data=rgba)
+
+    def is_empty(self):
+        if self.strokes:
+            return False
+        return self.image_data is None or ink_bbox(self.image_data) is None
+
+    def payload_size(self):
+        """Bytes of signature data captured from the canvas."""
+        if self.strokes:
+            return len(json.dumps(self.strokes, separators=(",", ":")))
+        return 0 if self._image_data is None else self._image_data.nbytes
+
+    def fingerprint(self, mode="vector"):
+        """Hash of exactly what ``flowable(mode)`` would draw."""
+        digest = hashlib.sha256()
+        if mode == "vector" and self.strokes:
+            digest.update(b"vector:")
+            digest.update(json.dumps(self.strokes, sort_keys=True, separators=(",", ":")).encode())
+        elif self.image_data is not None and ink_bbox(self.image_data) is not None:
+            top, left, bottom, right = ink_bbox(self.image_data)
+            ink = self.image_data[top:bottom, left:right, 3] > 0
+            digest.update(f"raster:{ink.shape}:".encode())
+            digest.update(np.packbits(ink).tobytes())
+        else:
+            digest.update(b"blank")
+        return digest.hexdigest()
+
+    def flowable(self, mode="vector", compact=False):
+        """``compact`` rounds vector coordinates to 0.01pt and caps raster
+        signatures at ``PRINT_DPI`` for their printed size."""
+        if mode == "vector" and self.strokes:
+            return VectorSignature(self.strokes, precision=2 if compact else None)
+        if self.image_data is not None and ink_bbox(self.image_data) is not None:
+            return raster_signature(self.image_data, dpi=PRINT_DPI if compact else None)
+        # unsigned: leave the signature box blank for a wet signature
+        return Spacer(SIGNATURE_WIDTH, SIGNATURE_HEIGHT)
+
+
+# -----------------------------
+# Vector rendering
+# -----------------------------
+def _stroke_points(stroke):
+    for command in stroke.get("path", []):
+        coords = command[1:]
+        for i in range(0, len(coords) - 1, 2):
+            yield coords[i], coords[i + 1]
+
+
+def strokes_bbox(strokes):
+    xs, ys = [], []
+    for stroke in strokes:
+        half = stroke.get("strokeWidth", 2) / 2
+        for x, y in _stroke_points(stroke):
+            xs.extend((x - half, x + half))
+            ys.extend((y - half, y + half))
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class VectorSignature(Flowable):
+    """Draws fabric.js freedraw paths, fitted into the signature box."""
+
+    def __init__(self, strokes, width=SIGNATURE_WIDTH, height=SIGNATURE_HEIGHT, precision=None):
+        super().__init__()
+        self.strokes = strokes
+        # decimal places kept in the path coordinates; None keeps ReportLab's default
+        self.precision = precision
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        bbox = strokes_bbox(self.strokes)
+        if bbox is None:
+            return
+        x0, y0, x1, y1 = bbox
+        scale = min(self.width / max(x1 - x0, 1), self.height / max(y1 - y0, 1))
+        # center the ink in the box; canvas y grows downwards, PDF y upwards
+        dx = (self.width - (x1 - x0) * scale) / 2
+        dy = (self.height - (y1 - y0) * scale) / 2
+
+        def pt(x, y):
+            if self.precision is None:
+                return dx + (x - x0) * scale, self.height - dy - (y - y0) * scale
+            return (round(dx + (x - x0) * scale, self.precision),
+                    round(self.height - dy - (y - y0) * scale, self.precision))
+
+        canv = self.canv
+        canv.saveState()
+        canv.setLineCap(1)
+        canv.setLineJoin(1)
+        for stroke in self.strokes:
+            canv.setStrokeColor(colors.toColor(stroke.get("stroke") or "#000000"))
+            canv.setLineWidth(max(stroke.get("strokeWidth", 2) * scale, 0.5))
+            path = canv.beginPath()
+            cur = (0, 0)
+            for command in stroke.get("path", []):
+                op, args = command[0], command[1:]
+                if op == "M":
+                    cur = pt(*args[:2])
+                    path.moveTo(*cur)
+                elif op == "L":
+                    cur = pt(*args[:2])
+                    path.lineTo(*cur)
+                elif op == "Q":
+                    # fabric emits quadratic segments; PDF only has cubic ones
+                    qx, qy = pt(*args[:2])
+                    ex, ey = pt(*args[2:4])
+                    path.curveTo(cur[0] + 2/3*(qx - cur[0]), cur[1] + 2/3*(qy - cur[1]),
+                                 ex + 2/3*(qx - ex), ey + 2/3*(qy - ey), ex, ey)
+                    cur = (ex, ey)
+                elif op == "C":
+                    c1, c2, cur = pt(*args[:2]), pt(*args[2:4]), pt(*args[4:6])
+                    path.curveTo(*c1, *c2, *cur)
+                elif op in ("Z", "z"):
+                    path.close()
+            canv.drawPath(path, stroke=1, fill=0)
+        canv.restoreState()
+
+
+# -----------------------------
+# Raster fallback
+# -----------------------------
+def rasterize_strokes(strokes, width, height):
+    """Draw freedraw paths into a transparent RGBA array of the pad's size."""
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for stroke in strokes:
+        points, cur = [], (0, 0)
+        for command in stroke.get("path", []):
+            op, args = command[0], command[1:]
+            if op == "M":
+                if len(points) > 1:
+                    draw.line(points, fill=(0, 0, 0, 255), width=round(stroke.get("strokeWidth", 2)), joint="curve")
+                cur = tuple(args[:2])
+                points = [cur]
+            elif op == "L":
+                cur = tuple(args[:2])
+                points.append(cur)
+            elif op == "Q":
+                (qx, qy), end = args[:2], tuple(args[2:4])
+                for t in (0.25, 0.5, 0.75, 1.0):
+                    points.append(((1 - t)**2 * cur[0] + 2 * (1 - t) * t * qx + t**2 * end[0],
+                                   (1 - t)**2 * cur[1] + 2 * (1 - t) * t * qy + t**2 * end[1]))
+                cur = end
+            elif op == "C":
+                c1, c2, end = args[:2], args[2:4], tuple(args[4:6])
+                for t in (0.25, 0.5, 0.75, 1.0):
+                    points.append(tuple((1 - t)**3 * p0 + 3 * (1 - t)**2 * t * p1 + 3 * (1 - t) * t**2 * p2 + t**3 * p3
+                                        for p0, p1, p2, p3 in zip(cur, c1, c2, end)))
+                cur = end
+        if len(points) == 1:
+            points.append(points[0])
+        if points:
+            draw.line(points, fill=(0, 0, 0, 255), width=round(stroke.get("strokeWidth", 2)), joint="curve")
+    return np.asarray(img)
+
+
+def ink_bbox(image_data):
+    """Bounding box ``(top, left, bottom, right)`` of drawn pixels, or None."""
+    # the canvas background is not part of image_data, so ink is any
+    # non-transparent pixel
+    ink = image_data[..., 3] > 0
+    rows = np.flatnonzero(ink.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(ink[rows[0]:rows[-1] + 1].any(axis=0))
+    return rows[0], cols[0], rows[-1] + 1, cols[-1] + 1
+
+
+def raster_signature(image_data, width=SIGNATURE_WIDTH, height=SIGNATURE_HEIGHT, dpi=None):
+    bbox = ink_bbox(image_data)
+    if bbox is None:
+        raise ValueError("Signature canvas is blank.")
+    top, left, bottom, right = bbox
+    ink = image_data[top:bottom, left:right, 3] > 0
+    if dpi:
+        ink = _downsample(ink, width * dpi / 72, height * dpi / 72)
+    img = Image.fromarray(~ink)  # mode "1": ink black on white
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    buf.seek(0)
+    scale = min(width / img.width, height / img.height)
+    return RLImage(buf, width=img.width * scale, height=img.height * scale)
+
+
+def _downsample(ink, max_width, max_height):
+    """Shrink an ink mask to fit ``max_width`` x ``max_height`` pixels."""
+    scale = min(max_width / ink.shape[1], max_height / ink.shape[0])
+    if scale >= 1:
+        return ink
+    size = (max(1, round(ink.shape[1] * scale)), max(1, round(ink.shape[0] * scale)))
+    # box-average, then keep any pixel with a quarter of its area inked so
+    # thin strokes survive the reduction
+    coverage = Image.fromarray(ink.astype(np.uint8) * 255).resize(size, Image.Resampling.BOX)
+    return np.asarray(coverage) >= 64
@@ -0,0 +1,38 @@
+"""Signature pad geometry and stroke validation.
+
+Shared by the stroke pad and the HTTP API, and free of numpy, PIL and
+ReportLab so the pad can load before anything is rendered.
+"""
+import math
+
+# size of the signature pads, in canvas pixels
+PAD_WIDTH = 700
+PAD_HEIGHT = 180
+STROKE_WIDTH = 2
+# bounds on the strokes one signature may hold
+MAX_STROKES = 200
+MAX_POINTS = 2000
+
+
+# path command -> number of coordinates it takes
+_PATH_ARGS = {"M": 2, "L": 2, "Q": 4, "C": 6}
+
+
+def clean_path(path, width=PAD_WIDTH, height=PAD_HEIGHT):
+    """Validate a stroke's ``[["M", x, y], ["L", x, y], ...]`` commands (Q and
+    C as fabric.js writes them) and clamp them to the pad; None when the
+    stroke is malformed or has a non-finite coordinate."""
+    cleaned = []
+    for command in path[:MAX_POINTS]:
+        if (not isinstance(command, list) or not command or len(command) != _PATH_ARGS.get(command[0], -1) + 1
+                or not all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+                           for v in command[1:])):
+            return None
+        coords = [min(max(v, 0), width if i % 2 == 0 else height) for i, v in enumerate(command[1:])]
+        cleaned.append([command[0], *coords])
+    return cleaned if cleaned and cleaned[0][0] == "M" else None
+
+
+def stroke_object(path, stroke_width=STROKE_WIDTH):
+    """A fabric.js-style path object, as ``st_canvas`` reports its strokes."""
+    return {"type": "path", "stroke": "#000000", "strokeWidth": stroke_width, "path": path}
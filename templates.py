@@ -0,0 +1,220 @@
+"""Versioned agreement templates, compiled once per process.
+
+Each template's text is split at its placeholders into a token list when it
+is registered; rendering is a single join over that list, so adding templates
+adds no per-request parsing.
+"""
+import re
+
+PLACEHOLDERS = ("[Client Name]", "[Effective Date]", "[State]", "[Agency Rep Name]")
+_PLACEHOLDER_RE = re.compile("(" + "|".join(re.escape(p) for p in PLACEHOLDERS) + ")")
+
+
+# -----------------------------
+# Compiled text
+# -----------------------------
+class CompiledText:
+    """Text split into literal strings and placeholder slots.
+
+    ``tokens`` alternates literals and slot indexes into ``placeholders``;
+    ``render`` fills every slot in one pass.
+    """
+
+    __slots__ = ("tokens", "placeholders")
+
+    def __init__(self, text):
+        placeholders = []
+        tokens = []
+        for i, part in enumerate(_PLACEHOLDER_RE.split(text)):
+            if i % 2:
+                if part not in placeholders:
+                    placeholders.append(part)
+                tokens.append(placeholders.index(part))
+            elif part:
+                tokens.append(part)
+        self.tokens = tuple(tokens)
+        self.placeholders = tuple(placeholders)
+
+    @property
+    def has_placeholders(self):
+        return bool(self.placeholders)
+
+    def render(self, values):
+        """``values`` maps placeholder (e.g. ``"[Client Name]"``) to its text."""
+        slots = [values[p] for p in self.placeholders]
+        return "".join(slots[t] if type(t) is int else t for t in self.tokens)
+
+
+class AgreementTemplate:
+    """One registered agreement variant.
+
+    ``version`` must be bumped whenever the text or the PDF layout changes;
+    ``version_id`` is printed on every page and is part of every stored
+    agreement's key.
+    """
+
+    def __init__(self, template_id, version, name, title, text, commission_rate):
+        self.template_id = template_id
+        self.version = version
+        self.name = name
+        self.title = title
+        self.text = text
+        self.commission_rate = commission_rate
+        self.compiled = CompiledText(text)
+
+    @property
+    def version_id(self):
+        return f"{self.template_id}-v{self.version}"
+
+    def render(self, values):
+        return self.compiled.render(values)
+
+
+# -----------------------------
+# Agreement text (replace in PDF)
+# -----------------------------
+AGREEMENT_TEXT = """
+AD MANAGER & PARTNERSHIP AGREEMENT
+
+This Ad Manager & Partnership Agreement (“Agreement”) is entered into between:
+
+The ATM Agency (“Agency”)  
+and  
+[Client Name] (“Client”)  
+Effective as of [Effective Date].
+
+1. SCOPE OF SERVICES
+The Agency will manage paid advertising campaigns, strategy, creative assets, and performance optimization for the Client’s digital products, online courses, and associated offers.
+
+Core responsibilities include:
+• Full ad account management (Facebook/Meta, Instagram, TikTok, Google, YouTube, or other platforms as needed)
+• Ad creation, creative direction, and copywriting
+• Campaign testing and optimization
+• Funnel monitoring and recommendations
+• Weekly and monthly performance reporting
+• Scaling campaigns based on performance metrics
+• Audience research and targeting
+• Offer positioning assistance
+• Budget allocation guidance
+
+2. COMMISSION & PAYMENT TERMS
+The Client agrees to pay The ATM Agency a commission of:
+
+10% of all sales generated from paid advertising campaigns managed by the Agency.
+
+Details:
+• Commission applies to digital products, online courses, downloads, coaching programs, and all digital-based revenue generated through Agency-managed campaigns.
+• Commission is calculated from gross revenue (before refunds, payment processor fees, or deductions).
+• Payments to the Agency are due within 7 days of each completed calendar month.
+• The Client must provide accurate sales data, dashboards, and reporting access.
+• If the Client uses a third-party payment processor, the Agency must be granted read-only access.
+
+3. AD SPEND & ACCOUNT ACCESS
+The Client agrees to:
+• Pay all advertising spend directly to the ad platform.
+• Provide necessary account access (Ad Manager, Pixel/Conversions API, Website, CRM, Funnels, etc.).
+• Maintain all accounts in good standing to prevent disruption.
+
+The Agency is not responsible for platform bans, disabled accounts, or restricted features.
+
+4. CONTENT & CREATIVE
+The Agency may create and test ad creatives, including images, videos, ad copy, headlines, and marketing scripts. The Client agrees to provide brand guidelines, product access, testimonials, and any requested materials.
+
+5. PERFORMANCE DISCLAIMER
+The Agency does not guarantee specific results, performance metrics, earnings, or sales outcomes. All advertising includes risk and is subject to platform algorithm changes.
+
+6. TERM & TERMINATION
+This Agreement renews month-to-month unless terminated with 14 days written notice by either party.
+
+Upon termination:
+• All commissions owed remain payable to the Agency.
+• The Agency will provide a transition period of up to 7 days.
+• The Client retains ownership of all ad accounts and assets the Client originally owned.
+• The Agency retains ownership of any proprietary frameworks or templates.
+
+7. CONFIDENTIALITY
+Both parties agree to strict confidentiality regarding customer data, funnels, sales systems, and marketing strategies. This clause survives termination.
+
+8. INTELLECTUAL PROPERTY
+The Client owns all content, funnels, products, and materials they provide. The Agency owns its internal processes, frameworks, and optimization systems. Creations specifically for the Client (ad copy, creatives, audiences, etc.) become Client-owned upon payment of all commissions.
+
+9. NON-DISPARAGEMENT
+Both parties agree not to make negative or harmful public statements about the other.
+
+10. LIMITATION OF LIABILITY
+The Agency shall not be liable for loss of revenue, ad account shutdowns, platform instability, third-party software issues, chargebacks, or customer disputes. Liability is limited to the amount paid by the Client in the last 30 days.
+
+11. GOVERNING LAW
+This Agreement is governed by the laws of the State of [State].
+
+12. ENTIRE AGREEMENT
+This Agreement constitutes the full understanding between the parties and supersedes all prior discussions.
+
+AGREED & ACCEPTED:
+
+______________________________
+Client
+Name: [Client Name]
+Date: _______________
+
+______________________________
+The ATM Agency
+Name: [Agency Rep Name]
+Date: _______________
+"""
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+TEMPLATES = {}
+DEFAULT_TEMPLATE_ID = "ad-manager"
+
+
+def register(template):
+    TEMPLATES[template.template_id] = template
+    return template
+
+
+def get_template(template_id=None):
+    return TEMPLATES[template_id or DEFAULT_TEMPLATE_ID]
+
+
+def template_for_version(version_id):
+    """The registered template a stored agreement's ``version_id`` was signed under.
+
+    Terms such as the commission rate are fixed per template id; a change
+    to them is registered as a new template, not a new version.
+    """
+    return TEMPLATES[version_id.rsplit("-v", 1)[0]]
+
+
+def _variant(text, *replacements):
+    for old, new in replacements:
+        if old not in text:
+            raise ValueError(f"template variant replaces missing text: {old!r}")
+        text = text.replace(old, new)
+    return text
+
+
+_MONTHLY_TERM = "This Agreement renews month-to-month unless terminated with 14 days written notice by either party."
+_ANNUAL_TERM = ("This Agreement has an initial term of 12 months and renews automatically for successive 12-month "
+                "terms unless either party gives 30 days written notice before the end of the current term.")
+
+# v2: version id printed in the page footer
+register(AgreementTemplate(
+    "ad-manager", 2, "Standard — 10% commission, month-to-month",
+    "Ad Manager & Partnership Agreement", AGREEMENT_TEXT, 0.10,
+))
+register(AgreementTemplate(
+    "ad-manager-15", 1, "Premium — 15% commission, month-to-month",
+    "Ad Manager & Partnership Agreement",
+    _variant(AGREEMENT_TEXT, ("10% of all sales", "15% of all sales")),
+    0.15,
+))
+register(AgreementTemplate(
+    "ad-manager-annual", 1, "Annual — 10% commission, 12-month term",
+    "Ad Manager & Partnership Agreement",
+    _variant(AGREEMENT_TEXT, (_MONTHLY_TERM, _ANNUAL_TERM)),
+    0.10,
+))